@@ -1,92 +1,133 @@
 import json
-from playwright.sync_api import sync_playwright, expect
-import time
+from backend.scraping import ejecutar_standalone, preparar_pagina, id_tarjeta, buscar_legales, guardar_legales
+
+URL = "https://www.carrefour.com.ar/descuentos-bancarios"
+
+# Se ejecutan dentro de la página y devuelven los datos crudos de todas las
+# tarjetas en un único viaje (en vez de varios por tarjeta).
+EXTRAER_TARJETAS_JS = """
+() => {
+    const P = "valtech-carrefourar-bank-promotions-0-x-";
+    const texto = (el) => el ? el.innerText.trim() : "";
+    return Array.from(document.querySelectorAll(`.${P}cardBox`)).map((t) => {
+        const img = t.querySelector(`div.${P}ColRightCard img`);
+        return {
+            estilos_logos: Array.from(t.querySelectorAll(`div.${P}iconItem div.${P}logoIcon`))
+                .map((l) => l.getAttribute("style") || ""),
+            detalles: texto(t.querySelector(`.${P}dateText`)),
+            logo_src: img ? img.getAttribute("src") : "",
+            descuento: texto(t.querySelector(`.${P}ColRightTittle`)),
+            tope: texto(t.querySelector(`.${P}ColRightText`)),
+            tiene_legales: !!t.querySelector('div.flex.flex-row.items-center.pointer[role="button"]'),
+        };
+    });
+}
+"""
+
+# Expande los legales de las tarjetas indicadas (todas a la vez) y devuelve sus textos.
+EXPANDIR_LEGALES_JS = """
+async (indices) => {
+    const P = "valtech-carrefourar-bank-promotions-0-x-";
+    const tarjetas = Array.from(document.querySelectorAll(`.${P}cardBox`));
+    const legal = (t) => t.querySelector(`div.${P}legalContent.pa3`);
+    const elegidas = indices.map((i) => tarjetas[i]);
+
+    elegidas.forEach((t) => {
+        const b = t && t.querySelector('div.flex.flex-row.items-center.pointer[role="button"]');
+        if (b) b.click();
+    });
+
+    const limite = Date.now() + 10000;
+    while (Date.now() < limite && elegidas.some((t) => t && !legal(t))) {
+        await new Promise((r) => setTimeout(r, 100));
+    }
+
+    return elegidas.map((t) => (t && legal(t)) ? legal(t).innerText : null);
+}
+"""
 
 def limpiar_texto(texto):
     texto = texto.replace("\\", "")  # elimina barras invertidas
     texto = texto.replace("\"", "'")  # reemplaza comillas dobles escapadas por simples
     return texto
 
-def obtener_promociones():
+def url_desde_estilo(style_attr):
+    if style_attr and "url(" in style_attr:
+        start = style_attr.find("url(") + 4
+        end = style_attr.find(")", start)
+        return style_attr[start:end].strip().strip('"').strip("'")
+    return None
+
+def normalizar_tarjeta(tarjeta):
+    aplica_en_urls = [u for u in map(url_desde_estilo, tarjeta["estilos_logos"]) if u]
+    src = tarjeta["logo_src"]
+    logo = f"https://www.carrefour.com.ar{src}" if src else ""
+
+    legales = ""
+    if tarjeta["tiene_legales"]:
+        if tarjeta["legales"] is None:
+            print("No se encontró el texto de legales")
+        else:
+            legales = limpiar_texto(tarjeta["legales"])
+
+    return {
+        "logo": logo,
+        "descuento": tarjeta["descuento"],
+        "tope": tarjeta["tope"],
+        "aplica_en": aplica_en_urls,
+        "detalles": tarjeta["detalles"],
+        "legales": legales.strip()
+    }
+
+async def extraer_promociones(contexto, cache_legales=None):
     promociones = []
 
-    with sync_playwright() as p:
-        navegador = p.chromium.launch(headless=False)
-        pagina = navegador.new_page()
-        pagina.goto("https://www.carrefour.com.ar/descuentos-bancarios", timeout=60000)
+    pagina = await contexto.new_page()
+    await preparar_pagina(pagina)
+    await pagina.goto(URL, timeout=60000)
+
+    # Intentamos cerrar el modal si aparece
+    try:
+        await pagina.wait_for_selector(".vtex-modal__close-icon", timeout=10000)
+        await pagina.click(".vtex-modal__close-icon")
+        print("Modal cerrado correctamente.")
+    except:
+        print("No se encontró el modal, continuando...")
+
+    tarjetas = await pagina.evaluate(EXTRAER_TARJETAS_JS)
+    print(len(tarjetas))
 
-        # Intentamos cerrar el modal si aparece
+    # Legales: sólo se expanden los de tarjetas que no se vieron en corridas anteriores
+    ids = [id_tarjeta({k: v for k, v in t.items() if k != "tiene_legales"}) for t in tarjetas]
+    conocidos = await buscar_legales(cache_legales, ids)
+    pendientes = [i for i, t in enumerate(tarjetas) if t["tiene_legales"] and ids[i] not in conocidos]
+    leidos = await pagina.evaluate(EXPANDIR_LEGALES_JS, pendientes) if pendientes else []
+    for i, tarjeta in enumerate(tarjetas):
+        tarjeta["legales"] = conocidos.get(ids[i])
+    for i, texto in zip(pendientes, leidos):
+        tarjetas[i]["legales"] = texto
+    print(f"Legales reutilizados: {len(conocidos)}, leídos: {len(pendientes)}")
+
+    promociones_por_tarjeta = {}
+    for i, tarjeta in enumerate(tarjetas):
         try:
-            pagina.wait_for_selector(".vtex-modal__close-icon", timeout=10000)
-            pagina.click(".vtex-modal__close-icon")
-            print("Modal cerrado correctamente.")
-        except:
-            print("No se encontró el modal, continuando...")
-
-        tarjetas = pagina.query_selector_all(".valtech-carrefourar-bank-promotions-0-x-cardBox")
-        print(len(tarjetas))
-        for tarjeta in tarjetas:
-            try:
-                
-                aplica_en_urls = []
-                icon_containers = tarjeta.query_selector_all("div.valtech-carrefourar-bank-promotions-0-x-iconItem")
-                for icon_container in icon_containers:
-                    logos = icon_container.query_selector_all("div.valtech-carrefourar-bank-promotions-0-x-logoIcon")
-                    for logo in logos:
-                        style_attr = logo.get_attribute("style")
-                        if style_attr and "url(" in style_attr:
-                            start = style_attr.find("url(") + 4
-                            end = style_attr.find(")", start)
-                            url = style_attr[start:end].strip().strip('"').strip("'")
-                            aplica_en_urls.append(url)
-
-                
-                detalles_el = tarjeta.query_selector(".valtech-carrefourar-bank-promotions-0-x-dateText")
-                detalles = detalles_el.inner_text().strip() if detalles_el else ""
-                # Imagen (medio de pago)
-                img_logo = tarjeta.query_selector("div.valtech-carrefourar-bank-promotions-0-x-ColRightCard img")
-                logo = ""
-                if img_logo:
-                    src = img_logo.get_attribute("src")
-                    logo = f"https://www.carrefour.com.ar{src}" if src else ""
-
-                # Textos visibles
-
-                descuento_el = tarjeta.query_selector(".valtech-carrefourar-bank-promotions-0-x-ColRightTittle")
-                descuento = descuento_el.inner_text().strip() if descuento_el else ""
-                tope_el = tarjeta.query_selector(".valtech-carrefourar-bank-promotions-0-x-ColRightText")
-                tope = tope_el.inner_text().strip() if tope_el else ""
-                 
-
-                # Legales
-                boton_legales = tarjeta.query_selector('div.flex.flex-row.items-center.pointer[role="button"]')
-                legales = ""
-                if boton_legales:
-                    boton_legales.click()
-                    try:
-                        tarjeta.wait_for_selector("div.valtech-carrefourar-bank-promotions-0-x-legalContent.pa3", timeout=10000)
-                        text = tarjeta.query_selector("div.valtech-carrefourar-bank-promotions-0-x-legalContent.pa3")
-                        legales = limpiar_texto(text.inner_text())
-                        
-                    except Exception as e:
-                        print(f"No se encontró el texto de legales: {e}")
-                  
-
-                    
-
-                promociones.append({
-                    "logo": logo,
-                    "descuento": descuento,
-                    "tope": tope,
-                    "aplica_en": aplica_en_urls,
-                    "detalles": detalles,
-                    "legales": legales.strip()
-                })
-            except Exception as e:
-                print(f"Error procesando tarjeta: {e}")
-
-        navegador.close()
-        return promociones
+            promociones_por_tarjeta[i] = normalizar_tarjeta(tarjeta)
+            promociones.append(promociones_por_tarjeta[i])
+        except Exception as e:
+            print(f"Error procesando tarjeta: {e}")
+
+    # Se recuerdan los legales recién leídos para la próxima corrida
+    await guardar_legales(cache_legales, {
+        ids[i]: promociones_por_tarjeta[i]["legales"]
+        for i in pendientes
+        if i in promociones_por_tarjeta and promociones_por_tarjeta[i]["legales"]
+    })
+
+    await pagina.close()
+    return promociones
+
+def obtener_promociones():
+    return ejecutar_standalone(extraer_promociones, headless=False)
 
 if __name__ == "__main__":
     promos = obtener_promociones()
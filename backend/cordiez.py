@@ -1,17 +1,18 @@
-from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
+from backend.scraping import ejecutar_standalone, preparar_pagina
 import hashlib
 import json
 
-def extract_promos_cordiez():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto("https://www.cordiez.com.ar/medios-de-pago", timeout=60000)
-        page.wait_for_selector("#prom-banc_dias_body", timeout=15000)
-        html = page.content()
-        browser.close()
+async def extraer_promos_cordiez(contexto):
+    page = await contexto.new_page()
+    await preparar_pagina(page)
+    await page.goto("https://www.cordiez.com.ar/medios-de-pago", timeout=60000)
+    await page.wait_for_selector("#prom-banc_dias_body", timeout=15000)
+    html = await page.content()
+    await page.close()
+    return parsear_promos_cordiez(html)
 
+def parsear_promos_cordiez(html):
     soup = BeautifulSoup(html, "html.parser")
     container = soup.select_one("#prom-banc_dias_body")
     dias = container.select(".prom-banc_dias_body_item")
@@ -50,9 +51,12 @@ def extract_promos_cordiez():
                 "legales": legales
             })
 
+    return discounts
+
+def extract_promos_cordiez():
     return {
         "supermarket": "CORDIEZ",
-        "discounts": discounts
+        "discounts": ejecutar_standalone(extraer_promos_cordiez)
     }
 
 if __name__ == "__main__":
@@ -64,4 +68,4 @@ if __name__ == "__main__":
     with open("promociones_cordiez_2.json", "w", encoding="utf-8") as f:
         json.dump(resultado, f, ensure_ascii=False, indent=2)
 
-    print("Archivo promociones_cordiez.json generado correctamente.")
\ No newline at end of file
+    print("Archivo promociones_cordiez.json generado correctamente.")
@@ -1,6 +1,23 @@
 import json
-from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
+from backend.scraping import ejecutar_standalone, preparar_pagina
+
+# Se ejecuta dentro de la página y devuelve los datos crudos de todas las tarjetas
+# en un único viaje; la limpieza se hace en Python.
+EXTRAER_TARJETAS_JS = """
+() => Array.from(document.querySelectorAll("#discounts li")).map((t) => {
+    const texto = (sel) => { const el = t.querySelector(sel); return el ? el.innerText : ""; };
+    const img = t.querySelector("img");
+    return {
+        dia: texto("p.alt-font.text-medium-gray.text-small"),
+        descuento: texto("p.line-height-normal.font-weight-700"),
+        descripcion_html: Array.from(t.querySelectorAll("p.line-height-normal.font-weight-600"))
+            .map((p) => p.innerHTML).join(""),
+        logo_src: img ? img.getAttribute("src") : null,
+        texto: texto("div.alt-font.text-medium-gray.text-extra-small"),
+    };
+})
+"""
 
 def limpiar_texto(texto):
     return texto.replace("\n", " ").replace("\xa0", " ").strip()
@@ -9,68 +26,65 @@ def extraer_texto_normalizado(html):
     soup = BeautifulSoup(html, "html.parser")
     return soup.get_text(separator=" ", strip=True)
 
-def obtener_promociones_coto():
+def normalizar_tarjeta(tarjeta):
+    # Día de la promoción
+    dia = limpiar_texto(tarjeta["dia"])
+
+    # Descuento
+    descuento = limpiar_texto(tarjeta["descuento"])
+
+    # Descripción con BeautifulSoup para que mantenga los espacios entre tags
+    descripcion = ""
+    if tarjeta["descripcion_html"]:
+        descripcion = extraer_texto_normalizado(tarjeta["descripcion_html"])
+
+    # detalle bien armado
+    detalle = f"{dia} {descripcion}".strip()
+
+    # Imagen del medio de pago
+    src = tarjeta["logo_src"]
+    if src and not src.startswith("http"):
+        src = "https://www.coto.com.ar" + src.replace("../", "/")
+    logo_url = src or ""
+
+    # Legales
+    text = limpiar_texto(tarjeta["texto"])
+    tope = ""
+    if "Tope" in text or "tope" in text or "Reintegro" in text:
+        tope = text.strip()
+    else:
+        detalle = f"{detalle} {text}".strip()
+
+    return {
+        "logo": logo_url,
+        "descuento": descuento,
+        "tope": tope,
+        "detalles": detalle,
+        "aplica_en": "",
+        "legales": "https://www.coto.com.ar/legales/"
+    }
+
+async def extraer_promociones_coto(contexto):
     promociones = []
 
-    with sync_playwright() as p:
-        navegador = p.chromium.launch(headless=True)
-        pagina = navegador.new_page()
-        pagina.goto("https://www.coto.com.ar/descuentos/index.asp", timeout=60000)
-
-        tarjetas = pagina.query_selector_all("#discounts li")
-        print(f"Se encontraron {len(tarjetas)} promociones.")
-
-        for tarjeta in tarjetas:
-            try:
-                # Día de la promoción
-                dia_el = tarjeta.query_selector("p.alt-font.text-medium-gray.text-small")
-                dia = limpiar_texto(dia_el.inner_text()) if dia_el else ""
-
-                # Descuento
-                descuento_el = tarjeta.query_selector("p.line-height-normal.font-weight-700")
-                descuento = limpiar_texto(descuento_el.inner_text()) if descuento_el else ""
-
-                # Descripción con BeautifulSoup para que mantenga los espacios entre tags
-                descripcion_el = tarjeta.query_selector_all("p.line-height-normal.font-weight-600")
-                descripcion = ""
-                if descripcion_el:
-                    html = "".join([p.inner_html() for p in descripcion_el])
-                    descripcion = extraer_texto_normalizado(html)
-
-                # detalle bien armado
-                detalle = f"{dia} {descripcion}".strip()
-
-                # Imagen del medio de pago
-                img_el = tarjeta.query_selector("img")
-                logo_url = ""
-                if img_el:
-                    src = img_el.get_attribute("src")
-                    if src and not src.startswith("http"):
-                        src = "https://www.coto.com.ar" + src.replace("../", "/")
-                    logo_url = src
-
-                # Legales
-                text_el = tarjeta.query_selector("div.alt-font.text-medium-gray.text-extra-small")
-                text = limpiar_texto(text_el.inner_text()) if text_el else ""
-                tope = ""
-                if "Tope" in text or "tope" in text or "Reintegro" in text:
-                    tope = text.strip()
-                else:
-                    detalle = f"{detalle} {text}".strip()
-
-                promociones.append({
-                    "logo": logo_url,
-                    "descuento": descuento,
-                    "tope": tope,
-                    "detalles": detalle,
-                    "aplica_en": "",
-                    "legales": "https://www.coto.com.ar/legales/"
-                })
-            except Exception as e:
-                print(f"Error procesando tarjeta: {e}")
-
-        navegador.close()
-        return promociones
+    pagina = await contexto.new_page()
+    await preparar_pagina(pagina)
+    await pagina.goto("https://www.coto.com.ar/descuentos/index.asp", timeout=60000)
+
+    tarjetas = await pagina.evaluate(EXTRAER_TARJETAS_JS)
+    print(f"Se encontraron {len(tarjetas)} promociones.")
+
+    for tarjeta in tarjetas:
+        try:
+            promociones.append(normalizar_tarjeta(tarjeta))
+        except Exception as e:
+            print(f"Error procesando tarjeta: {e}")
+
+    await pagina.close()
+    return promociones
+
+def obtener_promociones_coto():
+    return ejecutar_standalone(extraer_promociones_coto)
 
 if __name__ == "__main__":
     promos = obtener_promociones_coto()
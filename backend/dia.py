@@ -1,70 +1,98 @@
 import json
-from playwright.sync_api import sync_playwright
-import time
+from backend.scraping import ejecutar_standalone, preparar_pagina, id_tarjeta, buscar_legales, guardar_legales
+
+URL = "https://diaonline.supermercadosdia.com.ar/medios-de-pago-y-promociones"
+TARJETA = ".diaio-custom-bank-promotions-0-x-list-by-days__item"
+BOTON_LEGALES = ".diaio-custom-bank-promotions-0-x-bank-modal__button"
+TEXTO_LEGALES = ".diaio-custom-bank-promotions-0-x-bank-modal__text"
+
+# Se ejecuta dentro de la página y devuelve los datos visibles de todas las tarjetas
+# en un único viaje. Los legales siguen requiriendo abrir el modal de cada una.
+EXTRAER_TARJETAS_JS = """
+([tarjeta, boton]) => Array.from(document.querySelectorAll(tarjeta)).map((t) => {
+    const img = t.querySelector("img.diaio-custom-bank-promotions-0-x-list-by-days__img-logo");
+    return {
+        logo: img ? img.getAttribute("src") : null,
+        texto: t.innerText,
+        tiene_legales: !!t.querySelector(boton),
+    };
+})
+"""
 
 def limpiar_texto(texto):
     texto = texto.replace("\\", "")  # elimina barras invertidas
     texto = texto.replace("\"", "'")  # reemplaza comillas dobles escapadas por simples
     return texto
 
-def obtener_promociones():
+def normalizar_tarjeta(tarjeta, legales):
+    # Textos visibles
+    texto = tarjeta["texto"].split("\n")
+    descuento = next((t for t in texto if "%" in t or "cuotas" in t.lower()), "")
+    tope = next((t for t in texto if "Tope" in t or "Sin mínimo" in t), "")
+    aplica_en = "online y tienda"
+    if "APLICA ONLINE" in texto and "APLICA TIENDA" not in texto:
+        aplica_en = "online"
+    elif "APLICA TIENDA" in texto and "APLICA ONLINE" not in texto:
+        aplica_en = "tienda"
+
+    return {
+        "logo": tarjeta["logo"],
+        "descuento": descuento,
+        "tope": tope,
+        "aplica_en": aplica_en,
+        "detalles": " ".join(texto),
+        "legales": legales.strip()
+    }
+
+async def extraer_promociones(contexto, cache_legales=None):
     promociones = []
+    nuevos_legales = {}
+
+    pagina = await contexto.new_page()
+    await preparar_pagina(pagina)
+    await pagina.goto(URL, timeout=60000)
 
-    with sync_playwright() as p:
-        navegador = p.chromium.launch(headless=True)
-        pagina = navegador.new_page()
-        pagina.goto("https://diaonline.supermercadosdia.com.ar/medios-de-pago-y-promociones", timeout=60000)
+    # Intentamos cerrar el modal si aparece
+    try:
+        await pagina.wait_for_selector(".vtex-modal__close-icon", timeout=10000)
+        await pagina.click(".vtex-modal__close-icon")
+        print("Modal cerrado correctamente.")
+    except:
+        print("No se encontró el modal, continuando...")
 
-        # Intentamos cerrar el modal si aparece
+    tarjetas = await pagina.evaluate(EXTRAER_TARJETAS_JS, [TARJETA, BOTON_LEGALES])
+    print(len(tarjetas))
+
+    ids = [id_tarjeta({k: v for k, v in t.items() if k != "tiene_legales"}) for t in tarjetas]
+    conocidos = await buscar_legales(cache_legales, ids)
+    print(f"Legales reutilizados: {len(conocidos)}")
+
+    for i, tarjeta in enumerate(tarjetas):
         try:
-            pagina.wait_for_selector(".vtex-modal__close-icon", timeout=10000)
-            pagina.click(".vtex-modal__close-icon")
-            print("Modal cerrado correctamente.")
-        except:
-            print("No se encontró el modal, continuando...")
-
-        tarjetas = pagina.query_selector_all(".diaio-custom-bank-promotions-0-x-list-by-days__item")
-        print(len(tarjetas))
-        for tarjeta in tarjetas:
-            try:
-                # Imagen (medio de pago)
-                img = tarjeta.query_selector("img.diaio-custom-bank-promotions-0-x-list-by-days__img-logo")
-                logo = img.get_attribute("src")
-
-                # Textos visibles
-                texto = tarjeta.inner_text().split("\n")
-                descuento = next((t for t in texto if "%" in t or "cuotas" in t.lower()), "")
-                tope = next((t for t in texto if "Tope" in t or "Sin mínimo" in t), "")
-                aplica_en = "online y tienda"
-                if "APLICA ONLINE" in texto and "APLICA TIENDA" not in texto:
-                    aplica_en = "online"
-                elif "APLICA TIENDA" in texto and "APLICA ONLINE" not in texto:
-                    aplica_en = "tienda"
-
-                # Legales
-                boton_legales = tarjeta.query_selector(".diaio-custom-bank-promotions-0-x-bank-modal__button")
-                legales = ""
-                if boton_legales:
-                    boton_legales.click()
-                    text = pagina.query_selector(".diaio-custom-bank-promotions-0-x-bank-modal__text")
-                   
-                    legales = limpiar_texto(text.inner_text())
-                    
-                    pagina.keyboard.press("Escape")
-
-                promociones.append({
-                    "logo": logo,
-                    "descuento": descuento,
-                    "tope": tope,
-                    "aplica_en": aplica_en,
-                    "detalles": " ".join(texto),
-                    "legales": legales.strip()
-                })
-            except Exception as e:
-                print(f"Error procesando tarjeta: {e}")
-
-        navegador.close()
-        return promociones
+            # Legales (sólo se abre el modal si la tarjeta no se vio antes)
+            legales = ""
+            if tarjeta["tiene_legales"]:
+                legales = conocidos.get(ids[i], "")
+                if not legales:
+                    await pagina.locator(TARJETA).nth(i).locator(BOTON_LEGALES).first.click()
+                    legales = limpiar_texto(await pagina.locator(TEXTO_LEGALES).first.inner_text(timeout=10000))
+                    await pagina.keyboard.press("Escape")
+
+            promo = normalizar_tarjeta(tarjeta, legales)
+            if promo["legales"] and ids[i] not in conocidos:
+                nuevos_legales[ids[i]] = promo["legales"]
+            promociones.append(promo)
+        except Exception as e:
+            print(f"Error procesando tarjeta: {e}")
+
+    # Se recuerdan los legales recién leídos para la próxima corrida
+    await guardar_legales(cache_legales, nuevos_legales)
+
+    await pagina.close()
+    return promociones
+
+def obtener_promociones():
+    return ejecutar_standalone(extraer_promociones)
 
 if __name__ == "__main__":
     promos = obtener_promociones()
@@ -0,0 +1,121 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+from backend.models import PromoFeatures
+
+# Se parsea el texto libre de cada promoción una sola vez, al guardarla.
+# El ranking y los filtros leen los campos derivados sin volver a usar regex.
+
+DIAS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+
+# "sábado" o "sábados": el plural también nombra el día
+_DIA = r"(" + "|".join(DIAS) + r")s?"
+_DIA_RE = re.compile(r"\b" + _DIA + r"\b")
+_RANGO_DIAS_RE = re.compile(r"\b" + _DIA + r"\s+a\s+" + _DIA + r"\b")
+_CUOTAS_RE = re.compile(r"(\d+)\s*cuotas sin interes")
+
+_PERIODOS = [
+    ("diario", re.compile(r"por dia|diario|x dia")),
+    ("semanal", re.compile(r"por semana|semanal|x semana")),
+    ("mensual", re.compile(r"por mes|mensual|x mes")),
+    ("por_compra", re.compile(r"por compra|por transaccion|por ticket")),
+]
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """
+    Minúsculas y sin tildes: "Miércoles" -> "miercoles".
+    """
+    texto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def extract_percentage(discount: str) -> int:
+    match = re.search(r"(\d+)\s*%", discount)
+    return int(match.group(1)) if match else 0
+
+def extract_tope_value(tope: str) -> int:
+    # Handles "Tope: $10.000" or similar
+    match = re.search(r"\$?\s*([\d\.]+)", tope.replace(".", "").replace(",", "."))
+    try:
+        return int(float(match.group(1))) if match else 0
+    except:
+        return 0
+
+def has_installments(discount: str, details: str) -> bool:
+    return "cuotas sin interés" in discount.lower() or "cuotas sin interés" in details.lower()
+
+def is_no_limit(tope: str) -> bool:
+    return "sin tope" in tope.lower() or "sin límite" in tope.lower()
+
+
+def extract_cap_period(tope: str) -> Optional[str]:
+    texto = normalizar(tope)
+    for periodo, patron in _PERIODOS:
+        if patron.search(texto):
+            return periodo
+    return None
+
+
+def extract_installment_count(discount: str, details: str) -> Optional[int]:
+    match = _CUOTAS_RE.search(normalizar(f"{discount} {details}"))
+    return int(match.group(1)) if match else None
+
+
+def extract_days(*textos: str) -> List[str]:
+    """
+    Días de la semana mencionados, en orden: "De lunes a miércoles" -> [lunes, martes, miercoles].
+    Si no menciona ninguno (o dice "todos los días") se asume que aplica todos los días.
+    """
+    texto = normalizar(" ".join(t or "" for t in textos))
+    if "todos los dias" in texto:
+        return list(DIAS)
+
+    dias = set(_DIA_RE.findall(texto))
+    for desde, hasta in _RANGO_DIAS_RE.findall(texto):
+        i, j = DIAS.index(desde), DIAS.index(hasta)
+        dias.update(DIAS[i:j + 1] if i <= j else DIAS[i:] + DIAS[:j + 1])
+    if "fin de semana" in texto or "fines de semana" in texto:
+        dias.update(["sabado", "domingo"])
+
+    return [d for d in DIAS if d in dias] or list(DIAS)
+
+
+def extract_channels(aplica_en) -> tuple:
+    """
+    (online, en tienda) a partir de `aplica_en`. Si no se puede determinar, ambos.
+    """
+    if isinstance(aplica_en, list):
+        aplica_en = " ".join(str(a) for a in aplica_en)
+    texto = normalizar(aplica_en)
+    online = "online" in texto
+    tienda = "tienda" in texto
+    if not online and not tienda:
+        return True, True
+    return online, tienda
+
+
+def extract_features(promo: dict) -> PromoFeatures:
+    """
+    Deriva los campos tipados de una promoción (dict con la forma de Descuento).
+    """
+    descuento = promo.get("descuento") or ""
+    tope = promo.get("tope") or ""
+    detalles = promo.get("detalles") or ""
+
+    no_limit = is_no_limit(tope)
+    cap_amount = extract_tope_value(tope)
+    online, in_store = extract_channels(promo.get("aplica_en"))
+
+    return PromoFeatures(
+        percentage=extract_percentage(descuento),
+        cap_amount=cap_amount if cap_amount and not no_limit else None,
+        cap_period=extract_cap_period(tope),
+        installments=has_installments(descuento, detalles),
+        installment_count=extract_installment_count(descuento, detalles),
+        no_limit=no_limit,
+        days=extract_days(descuento, detalles, tope),
+        online=online,
+        in_store=in_store,
+    )
@@ -1,75 +1,140 @@
 import json
-from playwright.sync_api import sync_playwright
-import time
+import asyncio
+from backend.scraping import ejecutar_standalone, preparar_pagina, id_tarjeta, buscar_legales, guardar_legales
+
+TARJETA = "li[class^='jumboargentinaio-store-theme-']"
+BOTON_VER_MAS = "div >> text='Ver más'"
+TEXTO_LEGALES = "div.jumboargentinaio-store-theme-GIZVxZXl8Eov5s5D3zZRv p"
+
+# Se ejecuta dentro de la página y devuelve los datos visibles de todas las tarjetas
+# del día en un único viaje. Los legales siguen requiriendo el click en "Ver más".
+EXTRAER_TARJETAS_JS = """
+(tarjeta) => Array.from(document.querySelectorAll(tarjeta)).map((t) => {
+    const texto = (el) => el ? el.innerText : "";
+    const img = t.querySelector("img");
+    return {
+        logo: img ? img.getAttribute("src") || "" : "",
+        descuento: texto(t.querySelector("h4")),
+        detalle: texto(t.querySelector("h6")),
+        info: texto(t.querySelector("p[class^='jumboargentinaio-store-theme']")),
+        tiene_legales: Array.from(t.querySelectorAll("div")).some((d) => d.textContent.trim() === "Ver más"),
+    };
+})
+"""
 
 def limpiar_texto(texto):
     return texto.replace("\\n", " ").replace("\\xa0", " ").strip()
 
-def obtener_promociones_jumbo():
+def normalizar_tarjeta(tarjeta):
+    return {
+        "logo": tarjeta["logo"],
+        "descuento": limpiar_texto(tarjeta["descuento"]),
+        "detalle": limpiar_texto(tarjeta["detalle"]),
+        "info": limpiar_texto(tarjeta["info"]),
+    }
+
+async def extraer_dia(contexto, dia, cache_legales=None):
+    """
+    Extrae las promociones de un día en su propia página.
+    Devuelve pares (clave, promoción); la deduplicación entre días la hace el llamador.
+    """
+    resultado = []
+    claves_del_dia = set()
+    nuevos_legales = {}
+
+    pagina = await contexto.new_page()
+    await preparar_pagina(pagina)
+
+    try:
+        url = f"https://www.jumbo.com.ar/descuentos-del-dia?type=por-dia&day={dia}"
+        await pagina.goto(url, timeout=60000)
+        await pagina.wait_for_selector(TARJETA)
+
+        tarjetas = await pagina.evaluate(EXTRAER_TARJETAS_JS, TARJETA)
+        print(f"Día {dia}: {len(tarjetas)} tarjetas encontradas.")
+
+        datos_por_tarjeta = [normalizar_tarjeta(t) for t in tarjetas]
+        ids = [id_tarjeta(datos) for datos in datos_por_tarjeta]
+        conocidos = await buscar_legales(cache_legales, ids)
+
+        for i, tarjeta in enumerate(tarjetas):
+            try:
+                datos = datos_por_tarjeta[i]
+
+                # Las repetidas dentro del mismo día se descartan antes de abrir sus legales
+                clave = (datos["logo"], datos["descuento"], datos["detalle"], datos["info"])
+                if clave in claves_del_dia:
+                    continue
+
+                # Ver más → legales (sólo si la tarjeta no se vio en corridas anteriores)
+                legales = conocidos.get(ids[i], "")
+                if tarjeta["tiene_legales"] and not legales:
+                    await pagina.locator(TARJETA).nth(i).locator(BOTON_VER_MAS).first.click()
+                    await pagina.wait_for_selector(TEXTO_LEGALES, timeout=10000)
+                    legales_el = await pagina.query_selector(TEXTO_LEGALES)
+                    if legales_el:
+                        legales = limpiar_texto(await legales_el.inner_text())
+                    # Cerrar el legal y esperar a que desaparezca (en vez de una pausa fija)
+                    await pagina.keyboard.press("Escape")
+                    try:
+                        await pagina.locator(TEXTO_LEGALES).first.wait_for(state="hidden", timeout=1000)
+                    except Exception:
+                        pass
+                    if legales:
+                        nuevos_legales[ids[i]] = legales
+
+                claves_del_dia.add(clave)
+                resultado.append((clave, {
+                    "logo": datos["logo"],
+                    "descuento": datos["descuento"],
+                    "tope": "Para Jumbo este valor aparece en detalles",
+                    "detalles": f"{datos['detalle']} {datos['info']}".strip(),
+                    "aplica_en": "",
+                    "legales": legales
+                }))
+            except Exception as e:
+                print(f"Error procesando tarjeta: {e}")
+
+        # Se recuerdan los legales recién leídos para la próxima corrida
+        await guardar_legales(cache_legales, nuevos_legales)
+    finally:
+        await pagina.close()
+
+    return resultado
+
+async def extraer_promociones_jumbo(contexto, paralelo=True, cache_legales=None):
+    """
+    Recorre los días 1..6. Con `paralelo` cada día se carga en una página distinta
+    del mismo contexto al mismo tiempo; si no, uno detrás de otro.
+    """
+    dias = range(1, 7)
+    if paralelo:
+        por_dia = await asyncio.gather(*[extraer_dia(contexto, dia, cache_legales) for dia in dias], return_exceptions=True)
+    else:
+        por_dia = []
+        for dia in dias:
+            try:
+                por_dia.append(await extraer_dia(contexto, dia, cache_legales))
+            except Exception as e:
+                por_dia.append(e)
+
+    # Merge en orden de día, sin repetidas entre días
     promociones = []
     promociones_vistas = set()
+    for dia, resultado in zip(dias, por_dia):
+        if isinstance(resultado, Exception):
+            print(f"Error procesando el día {dia}: {resultado}")
+            continue
+        for clave, promo in resultado:
+            if clave in promociones_vistas:
+                continue
+            promociones_vistas.add(clave)
+            promociones.append(promo)
+
+    return promociones
 
-    with sync_playwright() as p:
-        navegador = p.chromium.launch(headless=False)
-        pagina = navegador.new_page()
-
-        for dia in range(1, 7):
-            url = f"https://www.jumbo.com.ar/descuentos-del-dia?type=por-dia&day={dia}"
-            pagina.goto(url, timeout=60000)
-            pagina.wait_for_selector("li[class^='jumboargentinaio-store-theme-']")
-
-            tarjetas = pagina.query_selector_all("li[class^='jumboargentinaio-store-theme-']")
-            print(f"Día {dia}: {len(tarjetas)} tarjetas encontradas.")
-
-            for tarjeta in tarjetas:
-                try:
-                    # Logo
-                    logo_el = tarjeta.query_selector("img")
-                    logo = logo_el.get_attribute("src") if logo_el else ""
-
-                    # Descuento
-                    descuento_el = tarjeta.query_selector("h4")
-                    descuento = limpiar_texto(descuento_el.inner_text()) if descuento_el else ""
-
-                    # Detalle
-                    detalle_el = tarjeta.query_selector("h6")
-                    detalle = limpiar_texto(detalle_el.inner_text()) if detalle_el else ""
-
-                    # Info adicional (posible tope y días)
-                    info_el = tarjeta.query_selector("p[class^='jumboargentinaio-store-theme']")
-                    info = limpiar_texto(info_el.inner_text()) if info_el else ""
-
-                    # Ver más → legales
-                    boton = tarjeta.query_selector("div >> text='Ver más'")
-                    legales = ""
-                    if boton:
-                        boton.click()
-                        pagina.wait_for_selector("div.jumboargentinaio-store-theme-GIZVxZXl8Eov5s5D3zZRv p", timeout=10000)
-                        legales_el = pagina.query_selector("div.jumboargentinaio-store-theme-GIZVxZXl8Eov5s5D3zZRv p")
-                        if legales_el:
-                            legales = limpiar_texto(legales_el.inner_text())
-                        # Cerrar el legal (click fuera o scroll)
-                        pagina.keyboard.press("Escape")
-                        time.sleep(0.3)
-
-                    clave = (logo, descuento, detalle, info)
-                    if clave in promociones_vistas:
-                        continue
-                    promociones_vistas.add(clave)
-
-                    promociones.append({
-                        "logo": logo,
-                        "descuento": descuento,
-                        "tope": "Para Jumbo este valor aparece en detalles",
-                        "detalles": f"{detalle} {info}".strip(),
-                        "aplica_en": "",
-                        "legales": legales
-                    })
-                except Exception as e:
-                    print(f"Error procesando tarjeta: {e}")
-
-        navegador.close()
-        return promociones
+def obtener_promociones_jumbo():
+    return ejecutar_standalone(extraer_promociones_jumbo)
 
 if __name__ == "__main__":
     promos = obtener_promociones_jumbo()
@@ -81,4 +146,4 @@ if __name__ == "__main__":
     with open("promociones_jumbo_2.json", "w", encoding="utf-8") as f:
         json.dump(resultado, f, ensure_ascii=False, indent=2)
 
-    print("Archivo promociones_jumbo_2.json generado correctamente.")
\ No newline at end of file
+    print("Archivo promociones_jumbo_2.json generado correctamente.")
@@ -0,0 +1,51 @@
+from typing import Dict, List
+
+from backend.redis_crud import r, LEGAL_TEXT_PREFIX, LEGAL_TEXT_TTL, legal_id, fetch_legal_texts
+
+# Memoria de legales para los scrapers (se les pasa como `cache_legales`).
+# Cada tarjeta se identifica por un hash de sus datos visibles (scraping.id_tarjeta);
+# si ya se vio en una corrida anterior se reutiliza su texto legal en lugar de
+# hacer click en "Ver más"/"Legales" y esperar el modal. Los textos se guardan una
+# sola vez por contenido (legal:text:<id>, ver redis_crud), compartidos con las promos:
+# acá se crean con vencimiento, que se quita cuando una promo guardada los usa.
+
+LEGAL_CARD_PREFIX = "legal:card:"     # "<sitio>:<id de tarjeta>" -> id del legal
+LEGAL_CARD_TTL = 14 * 24 * 3600       # si una tarjeta no se ve en 2 semanas se olvida
+
+
+class CacheLegales:
+    def __init__(self, sitio: str):
+        self.sitio = sitio.lower()
+
+    def _clave(self, tarjeta: str) -> str:
+        return f"{LEGAL_CARD_PREFIX}{self.sitio}:{tarjeta}"
+
+    async def buscar(self, tarjetas: List[str]) -> Dict[str, str]:
+        """
+        Legales ya conocidos para las tarjetas dadas (id de tarjeta -> texto).
+        """
+        if not tarjetas:
+            return {}
+        ids_legales = await r.mget([self._clave(t) for t in tarjetas])
+        textos = await fetch_legal_texts(i for i in ids_legales if i)
+        return {
+            t: textos[i]
+            for t, i in zip(tarjetas, ids_legales)
+            if i in textos
+        }
+
+    async def guardar(self, legales: Dict[str, str]) -> None:
+        """
+        Recuerda el legal de cada tarjeta (id de tarjeta -> texto) y renueva su vigencia.
+        """
+        if not legales:
+            return
+        async with r.pipeline(transaction=False) as pipe:
+            for tarjeta, texto in legales.items():
+                if not texto:
+                    continue
+                lid = legal_id(texto)
+                pipe.set(f"{LEGAL_TEXT_PREFIX}{lid}", texto, nx=True, ex=LEGAL_TEXT_TTL)
+                pipe.set(self._clave(tarjeta), lid, ex=LEGAL_CARD_TTL)
+            await pipe.execute()
+
@@ -0,0 +1,166 @@
+import os
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.models import Descuento
+from backend.redis_crud import r, legal_summary_key, LEGAL_TEXT_PREFIX
+
+# Cache persistente (Redis) de resultados del modelo.
+# Extracción: un hash por (supermercado, día) cuyo campo es
+# "<versión del prompt>:<huella de la fuente>", así cambiar el prompt o el
+# contenido de la página invalida sin borrar nada, y borrar el hash invalida todo.
+# Resúmenes: direccionados por contenido (legal_summary_key del legal_id del texto).
+# Es el mismo almacenamiento que completa `legales_resumen` al leer promociones:
+# los de textos que usa alguna promo (legal:text:<id> sin vencimiento) no vencen;
+# los de cualquier otro texto (POST /summary es público) vencen a los SUMMARY_TTL segundos.
+
+EXTRACTION_PREFIX = "llm:extract:"
+EXTRACTION_TTL = int(os.getenv("LLM_EXTRACTION_CACHE_TTL", str(48 * 3600)))
+SUMMARY_LRU_SIZE = int(os.getenv("SUMMARY_LRU_SIZE", "1024"))
+SUMMARY_TTL = int(os.getenv("LLM_SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+class LRUCache:
+    """LRU en memoria del proceso, delante de Redis para los textos más pedidos."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+summary_lru = LRUCache(SUMMARY_LRU_SIZE)
+
+
+def _extraction_key(supermercado: str, dia: str) -> str:
+    return f"{EXTRACTION_PREFIX}{supermercado.lower()}:{dia}"
+
+
+def _extraction_field(prompt_version: str, huella: Optional[str]) -> str:
+    return f"{prompt_version}:{huella or '-'}"
+
+
+async def get_cached_extraction(
+    supermercado: str, dia: str, prompt_version: str, huella: Optional[str] = None
+) -> Optional[List[Descuento]]:
+    try:
+        raw = await r.hget(_extraction_key(supermercado, dia), _extraction_field(prompt_version, huella))
+    except Exception as e:
+        print(f"⚠️ Error leyendo cache de extracción: {e}")
+        return None
+    if raw is None:
+        return None
+    return [Descuento(**d) for d in json.loads(raw)]
+
+
+async def set_cached_extraction(
+    supermercado: str,
+    dia: str,
+    prompt_version: str,
+    descuentos: List[Descuento],
+    huella: Optional[str] = None,
+) -> None:
+    key = _extraction_key(supermercado, dia)
+    try:
+        async with r.pipeline(transaction=True) as pipe:
+            # Sólo se conserva la entrada vigente de cada (supermercado, día)
+            pipe.delete(key)
+            pipe.hset(key, _extraction_field(prompt_version, huella), json.dumps([d.model_dump() for d in descuentos]))
+            pipe.expire(key, EXTRACTION_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Error guardando cache de extracción: {e}")
+
+
+async def invalidate_extraction_cache(supermercados: List[str], dias: List[str]) -> int:
+    """
+    Borra las extracciones cacheadas de esas combinaciones. Devuelve cuántas había.
+    """
+    keys = [_extraction_key(s, d) for s in supermercados for d in dias]
+    return await r.delete(*keys) if keys else 0
+
+
+async def get_cached_summary(key: str) -> Optional[str]:
+    cached = summary_lru.get(key)
+    if cached is not None:
+        return cached
+    try:
+        cached = await r.get(legal_summary_key(key))
+    except Exception as e:
+        print(f"⚠️ Error leyendo cache de resúmenes: {e}")
+        return None
+    if cached is not None:
+        summary_lru.put(key, cached)
+    return cached
+
+
+async def get_cached_summaries(keys: List[str]) -> Dict[str, str]:
+    """Resúmenes ya calculados de varias claves, en un solo MGET."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    values = await r.mget([legal_summary_key(k) for k in keys])
+    return {k: v for k, v in zip(keys, values) if v is not None}
+
+
+async def set_cached_summaries(summaries: Dict[str, str]) -> None:
+    if not summaries:
+        return
+    for key, summary in summaries.items():
+        summary_lru.put(key, summary)
+    keys = list(summaries)
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(f"{LEGAL_TEXT_PREFIX}{key}")
+            ttls = await pipe.execute()
+        async with r.pipeline(transaction=False) as pipe:
+            for key, ttl in zip(keys, ttls):
+                # -1: el texto existe sin vencimiento, o sea que lo usa alguna promo (ver redis_crud)
+                pipe.set(legal_summary_key(key), summaries[key], ex=None if ttl == -1 else SUMMARY_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Error guardando cache de resúmenes: {e}")
+
+
+async def persist_summaries(keys: List[str]) -> None:
+    """Quita el vencimiento de resúmenes cuyo texto pasó a usarlo alguna promo (ver summary_service)."""
+    if not keys:
+        return
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.ttl(f"{LEGAL_TEXT_PREFIX}{key}")
+        ttls = await pipe.execute()
+    async with r.pipeline(transaction=False) as pipe:
+        for key, ttl in zip(keys, ttls):
+            if ttl == -1:
+                pipe.persist(legal_summary_key(key))
+        await pipe.execute()
+
+
+async def set_cached_summary(key: str, summary: str) -> None:
+    await set_cached_summaries({key: summary})
+
+
+if __name__ == "__main__":
+    # python -m backend.llm_cache [supermercado ...]: descarta las extracciones cacheadas
+    # (de todos los supermercados si no se indica ninguno) para forzar la próxima corrida
+    import sys
+    import asyncio
+    from backend.openai_agent import supermercados, dias
+
+    nombres = sys.argv[1:] or list(supermercados)
+    borradas = asyncio.run(invalidate_extraction_cache(nombres, dias))
+    print(f"🗑️ {borradas} extracciones cacheadas borradas")
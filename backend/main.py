@@ -1,23 +1,45 @@
 import os
+import json
 import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
 from dotenv import load_dotenv
-import redis.asyncio as redis
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse
+from fastapi.routing import APIRoute
 
-from backend.models import UsuarioInput, UpdateInfo, SummaryRequest
+from backend.models import UsuarioInput, UpdateInfo, SummaryRequest, RankingWeights, RankingFilter
 from backend.redis_crud import (
+    r as redis_client,
+    check_connection,
+    close_connection,
+    ensure_indexes,
+    get_view,
+    get_supermarket_views,
+    VIEW_TOP_KEY,
+    VIEW_WALLETS_KEY,
+    VIEW_SUPERMARKETS_KEY,
+    DEFAULT_TOP_LIMIT,
+    content_etag,
+    get_catalog_version,
     get_top_discounts,
     update_promotions,
     get_all_wallets,
     get_all_supermarkets,
     get_promotions_by_wallet_names,
-    get_promotions_by_supermarket_names,
+    get_promotions_page,
+    get_supermarket_members,
+    get_wallet_members,
 )
-from backend.openai_agent import procesar_supermercados, get_summary
+from backend.ranking import rank_discounts
+from backend.static_files import StaticSite
+from backend.openai_agent import get_summary_async, stream_summary
+from backend.services.jobs_service import enqueue_refresh, get_job
+from backend.services.summary_service import summarize_pending_legales
 from backend.services.remuneradas_service import (
+    get_cached_raw,
     get_cached_or_refresh,
     refresh_remuneradas,
     schedule_daily_job,
@@ -26,15 +48,54 @@ from backend.services.remuneradas_service import (
 
 load_dotenv()
 
-app = FastAPI()
 
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST"),
-    port=int(os.getenv("REDIS_PORT", "6379")),
-    username=os.getenv("REDIS_USER_NAME"),
-    password=os.getenv("PASS_REDIS"),
-    decode_responses=True,
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if await check_connection():
+        await ensure_indexes()
+    yield
+    await close_connection()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# Cache HTTP (segundos) de los endpoints de catálogo y de tasas; con ETag
+# los clientes/CDN revalidan y reciben 304 mientras no cambie nada
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))
+RATES_MAX_AGE = int(os.getenv("RATES_MAX_AGE", "3600"))
+
+
+def json_response(content, etag: Optional[str] = None, max_age: Optional[int] = None) -> Response:
+    """
+    Respuesta JSON sin pasar por jsonable_encoder: bytes ya serializados
+    (vistas materializadas en Redis) o datos que se serializan con orjson.
+    Con `max_age` agrega ETag (el dado o un hash del contenido) y Cache-Control.
+    """
+    if not isinstance(content, (bytes, str)):
+        content = orjson.dumps(content)
+    response = Response(content=content, media_type="application/json")
+    if max_age is not None:
+        response.headers.update(cache_headers(etag or content_etag(response.body), max_age))
+    return response
+
+
+def cache_headers(etag: str, max_age: int) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+
+def not_modified(request: Request, etag: Optional[str], max_age: int) -> Optional[Response]:
+    """
+    304 si el If-None-Match del request incluye `etag` (o es "*"), si no None.
+    Acepta también la forma débil (W/"...") que agregan algunos proxies al comprimir.
+    """
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return None
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=cache_headers(etag, max_age))
+    return None
 
 
 app.add_middleware(
@@ -46,68 +107,183 @@ app.add_middleware(
 )
 
 
-@app.post("/create/promotions")
-def obtener_descuentos():
-    resultados = procesar_supermercados()
-    for supermercado in resultados:
-        update_promotions(supermercado.supermercado, [d.model_dump() for d in supermercado.descuentos])
-    return resultados
+@app.post("/create/promotions", status_code=202)
+async def obtener_descuentos(force: bool = False):
+    """
+    Encola un refresco de promociones para el worker (backend/services/jobs_service.py)
+    y devuelve el id del job; el progreso se consulta en /jobs/{job_id}.
+    force=true ignora el cache de extracción y vuelve a consultar al modelo.
+    """
+    return await enqueue_refresh(force)
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
 
 @app.put("/update/promotion")
-def update_promotions_endpoint(body: UpdateInfo):
-    success = update_promotions(body.supermarket, [p.model_dump() for p in body.discounts])
+async def update_promotions_endpoint(body: UpdateInfo, background_tasks: BackgroundTasks):
+    success = await update_promotions(body.supermarket, [p.model_dump() for p in body.discounts])
+    background_tasks.add_task(summarize_pending_legales)
     return {"success": success}
 
 @app.post("/promotions/user")
-def descuentos_usuario(input: UsuarioInput):
+async def descuentos_usuario(input: UsuarioInput):
     values = (
         input.filter_value
         if isinstance(input.filter_value, list)
         else [input.filter_value]
     )
+    if input.is_paged():
+        if input.filter_type == "wallet":
+            members, labels = await get_wallet_members(values), None
+        elif input.filter_type == "supermarket":
+            members, labels = await get_supermarket_members(values), {v.lower(): v for v in values}
+        else:
+            members, labels = [], None
+        try:
+            page = await get_promotions_page(members, input.fields, input.sort, input.limit, input.cursor, labels)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="cursor inválido")
+        return json_response(page)
+
     if input.filter_type == "wallet":
-        result = get_promotions_by_wallet_names(values)
+        result = await get_promotions_by_wallet_names(values)
     elif input.filter_type == "supermarket":
-        result = get_promotions_by_supermarket_names(values)
+        # Se arma el JSON con las listas ya serializadas de cada supermercado
+        partes = [
+            b'{"supermarket":' + orjson.dumps(market) + b',"discounts":' + view.encode() + b"}"
+            for market, view in zip(values, await get_supermarket_views(values))
+            if view is not None
+        ]
+        return json_response(b'{"result":[' + b",".join(partes) + b"]}")
     else:
         result = []
-    return {"result": result}
+    return json_response({"result": result})
 
 @app.get("/promotions/top")
-def get_top_discounts_api():
-    result = get_top_discounts()
-    return {"top_discounts": result}
+async def get_top_discounts_api(
+    request: Request,
+    limit: int = Query(5, ge=1, le=100),
+    wallets: List[str] = Query([]),
+    supermarkets: List[str] = Query([]),
+    channel: Optional[Literal["online", "tienda"]] = None,
+    w_cap: float = 1.0,
+    w_percentage: float = 1.0,
+    w_installments: float = 1.0,
+):
+    weights = RankingWeights(cap=w_cap, percentage=w_percentage, installments=w_installments)
+    filtro = RankingFilter(wallets=wallets, supermarkets=supermarkets, channel=channel)
+    # Sin personalización se usa el ranking precalculado en Redis
+    if weights == RankingWeights() and filtro == RankingFilter() and limit == DEFAULT_TOP_LIMIT:
+        return await view_response(request, VIEW_TOP_KEY, lambda: get_top_discounts(limit), "top_discounts")
+
+    # ETag por versión del catálogo: se lee antes que los datos, así nunca
+    # queda asociado a un contenido más viejo que el que se devuelve
+    etag = f'"v{await get_catalog_version()}"'
+    if (response := not_modified(request, etag, CATALOG_MAX_AGE)) is not None:
+        return response
+    if weights == RankingWeights() and filtro == RankingFilter():
+        result = await get_top_discounts(limit)
+    else:
+        result = await rank_discounts(weights, filtro, limit)
+    return json_response({"top_discounts": result}, etag, CATALOG_MAX_AGE)
+
+
+async def view_response(request: Request, key: str, fallback, wrap: Optional[str] = None) -> Response:
+    """
+    Devuelve una vista materializada con su ETag (o 304), o la calcula con
+    `fallback` si todavía no existe (envuelta en {wrap: ...} si se indica).
+    """
+    body, etag = await get_view(key)
+    if body is None:
+        result = await fallback()
+        return json_response({wrap: result} if wrap else result, max_age=CATALOG_MAX_AGE)
+    if (response := not_modified(request, etag, CATALOG_MAX_AGE)) is not None:
+        return response
+    return json_response(body, etag, CATALOG_MAX_AGE)
 
 @app.get("/wallets")
-def get_available_wallets():
-    result = get_all_wallets()
-    return result
+async def get_available_wallets(request: Request):
+    return await view_response(request, VIEW_WALLETS_KEY, get_all_wallets)
 
 @app.get("/supermarkets")
-def get_available_supermarkets():
+async def get_available_supermarkets(request: Request):
     """
     Devuelve la lista de supermercados disponibles.
     """
-    return get_all_supermarkets()
+    return await view_response(request, VIEW_SUPERMARKETS_KEY, get_all_supermarkets)
 
 @app.post("/summary")
-def summarize_text(body: SummaryRequest):
-    result = get_summary(body)
+async def summarize_text(body: SummaryRequest):
+    result = await get_summary_async(body)
     return {"summary": result}
 
+@app.post("/summary/stream")
+async def summarize_text_stream(body: SummaryRequest):
+    """
+    Igual que /summary pero por Server-Sent Events: un evento `data: {"delta": ...}`
+    por fragmento y `event: done` con el texto completo al final (o `event: error`).
+    """
+    async def eventos():
+        partes = []
+        try:
+            async for delta in stream_summary(body):
+                partes.append(delta)
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"❌ Error en resumen (stream): {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'No se pudo generar el resumen'}, ensure_ascii=False)}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'summary': ''.join(partes)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        # Sin buffering en proxies (nginx) para que el primer fragmento llegue enseguida
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.get("/rates/remuneradas")
-async def get_remuneradas_endpoint():
-    return await get_cached_or_refresh(redis_client)
+async def get_remuneradas_endpoint(request: Request):
+    cached = await get_cached_raw(redis_client)
+    if cached is None:
+        result = await get_cached_or_refresh(redis_client)
+        if result.get("status") == "emergency_fallback":
+            return json_response(result)
+        return json_response(result, max_age=RATES_MAX_AGE)
+    # ETag del JSON guardado tal cual, sin parsearlo
+    body = cached.encode()
+    etag = content_etag(body)
+    if (response := not_modified(request, etag, RATES_MAX_AGE)) is not None:
+        return response
+    return json_response(body, etag, RATES_MAX_AGE)
 
 current_dir = os.path.dirname(os.path.realpath(__file__))
 frontend_path = os.path.join(current_dir, "..", "frontend", "dist")
 
+# Frontend en memoria (con variantes br/gzip); index.html para las rutas del SPA
+static_site = StaticSite(frontend_path)
+static_site.load()
 
-app.mount("/", StaticFiles(directory=frontend_path, html=True), name="static")
+# Primer segmento de cada ruta de la API: esas rutas nunca caen en el index.html del SPA
+API_PREFIXES = {route.path.strip("/").split("/", 1)[0] for route in app.routes if isinstance(route, APIRoute)}
 
-@app.get("/{full_path:path}")
-async def catch_all(full_path: str):
-    index_path = os.path.join(os.path.dirname(__file__), "../frontend/dist/index.html")
-    print("Serving frontend from:", index_path)
-    return FileResponse(index_path)
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def catch_all(request: Request, full_path: str):
+    if full_path.split("/", 1)[0] in API_PREFIXES:
+        # p. ej. GET /promotions/user (sólo POST): 405 con los métodos válidos, o 404
+        allowed = sorted({
+            method
+            for route in app.routes
+            if isinstance(route, APIRoute) and route.endpoint is not catch_all
+            and route.path_regex.match(f"/{full_path}")
+            for method in route.methods
+        })
+        if allowed:
+            raise HTTPException(status_code=405, headers={"Allow": ", ".join(allowed)})
+        raise HTTPException(status_code=404)
+    return static_site.response(request, full_path)
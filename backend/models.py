@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import List, Literal, Optional, Union
 from pydantic import BaseModel, Field
 
 class Descuento(BaseModel):
@@ -7,16 +7,38 @@ class Descuento(BaseModel):
     aplica_en: Optional[Union[str, List[str]]] = None
     tope: str
     detalles: str
-    legales: Optional[str]
+    legales: Optional[str] = None
+    legales_resumen: Optional[str] = None
+    logo: Optional[str] = None
 
 
 class InfoSupermercado(BaseModel):
     supermercado: str
     descuentos: List[Descuento]
 
+class ExtraccionDia(BaseModel):
+    """Resultado parcial de la extracción con OpenAI para un (supermercado, día)."""
+    supermercado: str
+    dia: str
+    descuentos: List[Descuento]
+    error: Optional[str] = None
+    desde_cache: bool = False
+
+PromoField = Literal[
+    "id", "medio_pago", "descuento", "tope", "aplica_en", "detalles", "logo", "legales", "legales_resumen"
+]
+
 class UsuarioInput(BaseModel):
     filter_type: str = Field(..., alias="filterType")
     filter_value: Union[str, List[str]] = Field(..., alias="filterValue")
+    # Proyección y paginación (opcionales): sin ellas la respuesta es la de siempre
+    fields: Optional[List[PromoField]] = None
+    limit: Optional[int] = Field(None, ge=1, le=500)
+    cursor: Optional[str] = None
+    sort: Literal["default", "score", "medio_pago"] = "default"
+
+    def is_paged(self) -> bool:
+        return bool(self.fields or self.limit or self.cursor or self.sort != "default")
 
     class Config:
         populate_by_name = True
@@ -27,3 +49,27 @@ class UpdateInfo(BaseModel):
 
 class SummaryRequest(BaseModel):
     text: str
+
+class PromoFeatures(BaseModel):
+    """Campos numéricos derivados del texto de un Descuento (ver backend/ingest.py)."""
+    percentage: int = 0
+    cap_amount: Optional[int] = None
+    cap_period: Optional[str] = None
+    installments: bool = False
+    installment_count: Optional[int] = None
+    no_limit: bool = False
+    days: List[str] = []
+    online: bool = True
+    in_store: bool = True
+
+class RankingWeights(BaseModel):
+    """Multiplicadores de cada componente del puntaje (1.0 = ranking por defecto)."""
+    cap: float = 1.0
+    percentage: float = 1.0
+    installments: float = 1.0
+
+
+class RankingFilter(BaseModel):
+    wallets: List[str] = []
+    supermarkets: List[str] = []
+    channel: Optional[Literal["online", "tienda"]] = None
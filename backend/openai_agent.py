@@ -1,9 +1,32 @@
-from openai import OpenAI
+from openai import (
+    AsyncOpenAI,
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+)
+import os
+import re
 import json
 import time
-from backend.models import Descuento, InfoSupermercado, SummaryRequest
+import random
+import asyncio
+import hashlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
-client = OpenAI()  # Lee la API key desde la variable de entorno OPENAI_API_KEY
+import httpx
+from bs4 import BeautifulSoup
+
+from backend.models import Descuento, InfoSupermercado, SummaryRequest, ExtraccionDia
+from backend.llm_cache import (
+    get_cached_extraction,
+    set_cached_extraction,
+    get_cached_summary,
+    set_cached_summary,
+)
+from backend.redis_crud import legal_id
+
+async_client = AsyncOpenAI()  # Lee la API key desde la variable de entorno OPENAI_API_KEY
 
 supermercados = {
     "Dia": "https://diaonline.supermercadosdia.com.ar/medios-de-pago-y-promociones",
@@ -12,29 +35,95 @@ supermercados = {
     "Jumbo": "https://www.jumbo.com.ar/descuentos-del-dia?type=por-banco"
 }
 
-def procesar_supermercados() -> list[InfoSupermercado]:
-    resultados = []
-    dias = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+dias = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
 
-    for nombre, url in supermercados.items():
-        print(f"🔍 Procesando {nombre} con web-search...")
+# Límites para las llamadas de extracción (ajustar a la cuota de la cuenta)
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "20"))          # requests por minuto
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "60000"))       # tokens por minuto (estimados)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "2"))
 
-        descuentos_totales = []
+EXTRACCION_MAX_TOKENS = 2048
+ERRORES_TRANSITORIOS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
-        for dia in dias:
-            print(f"🕵️‍♂️ Procesando promociones para el día: {dia}...")
 
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-4o-search-preview",
-                    max_tokens=2048,
-                    web_search_options={
-                        "search_context_size": "high",
-                    },
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": f"""
+class RateLimiter:
+    """
+    Token bucket por minuto para requests y tokens. `acquire` espera hasta que
+    haya cupo para un request de `tokens` tokens estimados.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm
+        self._tokens = tpm
+        self._actualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        transcurrido = ahora - self._actualizado
+        self._actualizado = ahora
+        self._requests = min(self.rpm, self._requests + transcurrido * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + transcurrido * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._recargar()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                espera = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                    0.05,
+                )
+                await asyncio.sleep(espera)
+
+
+rate_limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
+
+
+def estimar_tokens(prompt: str, max_tokens: int) -> int:
+    # ~4 caracteres por token, más lo máximo que puede devolver
+    return len(prompt) // 4 + max_tokens
+
+
+async def completar_con_reintentos(prompt: str, max_tokens: int, **kwargs):
+    """
+    Llama al modelo respetando el rate limiter y reintenta con backoff exponencial
+    (o el Retry-After que indique la API) ante errores transitorios.
+    """
+    for intento in range(OPENAI_MAX_RETRIES + 1):
+        await rate_limiter.acquire(estimar_tokens(prompt, max_tokens))
+        try:
+            return await async_client.chat.completions.create(
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs,
+            )
+        except ERRORES_TRANSITORIOS as e:
+            if intento == OPENAI_MAX_RETRIES:
+                raise
+            espera = OPENAI_BACKOFF_BASE * 2 ** intento + random.uniform(0, 1)
+            respuesta = getattr(e, "response", None)
+            retry_after = respuesta.headers.get("retry-after") if respuesta is not None else None
+            if retry_after:
+                try:
+                    espera = max(espera, float(retry_after))
+                except ValueError:
+                    pass
+            print(f"⏳ Error transitorio ({type(e).__name__}), reintento {intento + 1} en {espera:.1f}s")
+            await asyncio.sleep(espera)
+
+
+def construir_prompt(nombre: str, url: str, dia: str) -> str:
+    return f"""
                             Visitá la siguiente URL del supermercado {nombre}: {url}
 
                             Extraé exclusivamente las promociones bancarias o de billeteras virtuales visibles para el día {dia}.
@@ -64,50 +153,229 @@ def procesar_supermercados() -> list[InfoSupermercado]:
                             ]
                             }}
                             """
-                        }
-                    ]
-                )
 
-                raw = response.choices[0].message.content
-                print(f"⚠️ La respuesta se truncó: {response.choices[0].finish_reason}")
-                print(f"✅ Respuesta recibida de {nombre} para el día {dia}")
 
-                try:
-                    parsed = json.loads(raw)
+# Cambia automáticamente si se modifica el prompt, invalidando el cache de extracción
+PROMPT_VERSION = hashlib.sha256(construir_prompt("", "", "").encode("utf-8")).hexdigest()[:12]
+
+HUELLA_TIMEOUT = float(os.getenv("SOURCE_FINGERPRINT_TIMEOUT", "10"))
+
+
+async def huella_fuente(session: httpx.AsyncClient, url: str) -> Optional[str]:
+    """
+    Huella barata del contenido de una página: su ETag o Last-Modified si los
+    manda, si no un hash del texto visible (sin scripts ni estilos, que cambian
+    en cada request). None si no se pudo descargar.
+    """
+    try:
+        response = await session.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"⚠️ No se pudo obtener la huella de {url}: {e}")
+        return None
+    validador = response.headers.get("etag") or response.headers.get("last-modified")
+    if validador:
+        return hashlib.sha256(validador.encode("utf-8")).hexdigest()[:12]
+    soup = BeautifulSoup(response.text, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    texto = re.sub(r"\s+", " ", soup.get_text(" ")).strip()
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:12]
+
+
+async def huellas_fuentes() -> Dict[str, str]:
+    """Huella de la página de cada supermercado (los que fallan quedan afuera)."""
+    async with httpx.AsyncClient(timeout=HUELLA_TIMEOUT, follow_redirects=True) as session:
+        huellas = await asyncio.gather(*[huella_fuente(session, url) for url in supermercados.values()])
+    return {nombre: h for nombre, h in zip(supermercados, huellas) if h}
+
+
+async def extraer_dia(
+    nombre: str,
+    url: str,
+    dia: str,
+    usar_cache: bool = True,
+    huella: Optional[str] = None,
+) -> ExtraccionDia:
+    """
+    Extrae las promociones de un supermercado para un día. Nunca lanza excepciones:
+    los errores quedan en `error` para que el resto de la corrida siga.
+    Con `usar_cache` primero busca un resultado previo para el mismo prompt y
+    la misma `huella` del contenido de la fuente (si se conoce).
+    """
+    if usar_cache:
+        cacheados = await get_cached_extraction(nombre, dia, PROMPT_VERSION, huella)
+        if cacheados is not None:
+            print(f"💾 {nombre} ({dia}) desde cache")
+            return ExtraccionDia(supermercado=nombre, dia=dia, descuentos=cacheados, desde_cache=True)
+
+    print(f"🕵️‍♂️ Procesando promociones de {nombre} para el día: {dia}...")
+    descuentos = []
+    invalidos = 0
 
-                    for i, d in enumerate(parsed.get("descuentos", [])):
-                        try:
-                            descuento = Descuento(**d)
-                            descuentos_totales.append(descuento)
-                        except Exception as e:
-                            print(f"⚠️ Error en descuento {i} del día {dia}: {e}")
-                            continue
+    try:
+        response = await completar_con_reintentos(
+            construir_prompt(nombre, url, dia),
+            EXTRACCION_MAX_TOKENS,
+            model="gpt-4o-search-preview",
+            web_search_options={
+                "search_context_size": "high",
+            },
+        )
 
-                except json.JSONDecodeError as e:
-                    print(f"⚠️ JSON inválido en {nombre} ({dia}): {e}")
+        raw = response.choices[0].message.content
+        if response.choices[0].finish_reason == "length":
+            print(f"⚠️ La respuesta se truncó: {response.choices[0].finish_reason}")
+        print(f"✅ Respuesta recibida de {nombre} para el día {dia}")
 
+        parsed = json.loads(raw)
+
+        items = parsed.get("descuentos", [])
+        for i, d in enumerate(items):
+            try:
+                descuentos.append(Descuento(**d))
             except Exception as e:
-                print(f"❌ Error al procesar {nombre} ({dia}): {e}")
+                print(f"⚠️ Error en descuento {i} del día {dia}: {e}")
+                invalidos += 1
+
+    except json.JSONDecodeError as e:
+        print(f"⚠️ JSON inválido en {nombre} ({dia}): {e}")
+        return ExtraccionDia(supermercado=nombre, dia=dia, descuentos=[], error=f"JSON inválido: {e}")
+    except Exception as e:
+        print(f"❌ Error al procesar {nombre} ({dia}): {e}")
+        return ExtraccionDia(supermercado=nombre, dia=dia, descuentos=descuentos, error=str(e))
+
+    if invalidos:
+        # Un resultado incompleto no se cachea: la próxima corrida vuelve a consultar
+        error = f"{invalidos} de {len(items)} descuentos inválidos" if not descuentos else None
+        return ExtraccionDia(supermercado=nombre, dia=dia, descuentos=descuentos, error=error)
 
-            time.sleep(1.2)
+    await set_cached_extraction(nombre, dia, PROMPT_VERSION, descuentos, huella)
+    return ExtraccionDia(supermercado=nombre, dia=dia, descuentos=descuentos)
 
-        supermercado_info = InfoSupermercado(
+
+async def procesar_supermercados_async(
+    concurrencia: Optional[int] = None,
+    on_parcial: Optional[Callable[[ExtraccionDia], Awaitable[None]]] = None,
+    usar_cache: bool = True,
+    huellas: Optional[Dict[str, str]] = None,
+) -> List[InfoSupermercado]:
+    """
+    Extrae todas las combinaciones (supermercado, día) en paralelo, con a lo sumo
+    `concurrencia` llamadas en vuelo y respetando el rate limiter.
+    `on_parcial` se llama con cada resultado (supermercado, día) apenas termina.
+    `huellas` (supermercado -> huella del contenido de su página) forman parte de
+    la clave del cache de extracción: si la página cambió, no se usa lo cacheado.
+    Si no se pasan se calculan acá (también sin cache, para guardar con la huella vigente).
+    """
+    if huellas is None:
+        huellas = await huellas_fuentes()
+    semaforo = asyncio.Semaphore(concurrencia or OPENAI_CONCURRENCY)
+
+    async def _tarea(nombre, url, dia):
+        async with semaforo:
+            parcial = await extraer_dia(nombre, url, dia, usar_cache, huellas.get(nombre))
+        if on_parcial:
+            await on_parcial(parcial)
+        return parcial
+
+    print(f"🔍 Procesando {len(supermercados)} supermercados x {len(dias)} días con web-search...")
+    parciales = await asyncio.gather(*[
+        _tarea(nombre, url, dia)
+        for nombre, url in supermercados.items()
+        for dia in dias
+    ])
+
+    resultados = []
+    for nombre in supermercados:
+        descuentos_totales = [d for p in parciales if p.supermercado == nombre for d in p.descuentos]
+        resultados.append(InfoSupermercado(
             supermercado=nombre,
             descuentos=descuentos_totales
-        )
-        resultados.append(supermercado_info)
+        ))
 
     return resultados
 
 
-def get_summary(body: SummaryRequest):
-    prompt = f"Resumí en pocas palabras este texto legal para un consumidor: {body.text}"
+SUMMARY_PROMPT = "Resumí en pocas palabras este texto legal para un consumidor: {texto}"
+
+# Resúmenes en curso por clave: pedidos concurrentes del mismo texto esperan la misma llamada
+_resumenes_en_vuelo: Dict[str, "asyncio.Future[str]"] = {}
+
+
+def summary_key(texto: str) -> str:
+    # Mismo id que el texto legal guardado: los resúmenes precalculados en la ingesta se reutilizan
+    return legal_id(texto)
+
+
+async def _resumir(clave: str, texto: str) -> str:
+    cacheado = await get_cached_summary(clave)
+    if cacheado is not None:
+        return cacheado
+    response = await async_client.chat.completions.create(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": SUMMARY_PROMPT.format(texto=texto)}],
+    )
+    resumen = response.choices[0].message.content
+    await set_cached_summary(clave, resumen)
+    return resumen
+
+
+async def get_summary_async(body: SummaryRequest):
+    clave = summary_key(body.text)
+    tarea = _resumenes_en_vuelo.get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_resumir(clave, body.text))
+        _resumenes_en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda _: _resumenes_en_vuelo.pop(clave, None))
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content
+        # shield: si un cliente corta, la llamada sigue para los demás que esperan
+        return await asyncio.shield(tarea)
     except Exception as e:
         print(f"❌ Error en resumen: {e}")
-        return {"error": "No se pudo generar el resumen"}
\ No newline at end of file
+        return {"error": "No se pudo generar el resumen"}
+
+
+async def stream_summary(body: SummaryRequest) -> AsyncIterator[str]:
+    """
+    Variante en streaming de get_summary_async: va devolviendo los fragmentos del
+    resumen a medida que llegan. Si ya está cacheado (o otro pedido lo está
+    generando) devuelve el texto completo de una vez. Mientras se genera queda
+    registrado en _resumenes_en_vuelo, así /summary y otros streams del mismo
+    texto esperan este resultado en lugar de llamar al modelo otra vez.
+    Al terminar el stream el resumen queda en el cache; si se corta a mitad no se guarda nada.
+    """
+    clave = summary_key(body.text)
+    cacheado = await get_cached_summary(clave)
+    if cacheado is None and clave in _resumenes_en_vuelo:
+        cacheado = await asyncio.shield(_resumenes_en_vuelo[clave])
+    if cacheado is not None:
+        yield cacheado
+        return
+
+    futuro: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+    _resumenes_en_vuelo[clave] = futuro
+    # Marca la excepción como leída aunque nadie más haya esperado este resumen
+    futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+    partes = []
+    try:
+        stream = await async_client.chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(texto=body.text)}],
+            stream=True,
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                partes.append(delta)
+                yield delta
+        resumen = "".join(partes)
+        await set_cached_summary(clave, resumen)
+        futuro.set_result(resumen)
+    except BaseException as e:
+        # Error del modelo o cliente que cortó el stream: los que esperaban reciben el error
+        if not futuro.done():
+            futuro.set_exception(e if isinstance(e, Exception) else RuntimeError("Stream de resumen interrumpido"))
+        raise
+    finally:
+        _resumenes_en_vuelo.pop(clave, None)
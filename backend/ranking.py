@@ -0,0 +1,115 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.models import PromoFeatures, RankingFilter, RankingWeights
+from backend.redis_crud import (
+    fetch_features_bulk,
+    find_wallet_members,
+    get_catalog_version,
+    get_registered_supermarkets,
+    group_members_by_supermarket,
+)
+
+# Ranking personalizado para /promotions/top.
+# Los features de todas las promociones (ver backend/ingest.py) se cargan una vez
+# por versión del catálogo en arrays de NumPy; cada request sólo combina esos
+# arrays con sus pesos y filtros y hace una selección parcial del top-k.
+
+
+@dataclass
+class Catalog:
+    version: int
+    members: np.ndarray            # "<super>:<id>", como en los índices de Redis
+    supermarkets: np.ndarray       # supermercado de cada fila
+    cap_points: np.ndarray         # 0..30 (30 si no tiene tope)
+    percentage_points: np.ndarray  # 0..30
+    installments: np.ndarray       # 1.0 si tiene cuotas sin interés
+    online: np.ndarray
+    in_store: np.ndarray
+
+
+def build_catalog(version: int, names: List[str], features: List[Optional[Dict[str, PromoFeatures]]]) -> Catalog:
+    members, supermarkets, rows = [], [], []
+    for name, feats in zip(names, features):
+        for promo_id, f in (feats or {}).items():
+            members.append(f"{name}:{promo_id}")
+            supermarkets.append(name)
+            rows.append(f)
+
+    cap_amount = np.array([f.cap_amount or 0 for f in rows], dtype=np.float64)
+    no_limit = np.array([f.no_limit for f in rows], dtype=bool)
+
+    return Catalog(
+        version=version,
+        members=np.array(members, dtype=object),
+        supermarkets=np.array(supermarkets, dtype=object),
+        cap_points=np.where(no_limit, 30.0, np.minimum(cap_amount / 1000, 30)),
+        percentage_points=np.minimum(np.array([f.percentage for f in rows], dtype=np.float64), 30),
+        installments=np.array([f.installments for f in rows], dtype=np.float64),
+        online=np.array([f.online for f in rows], dtype=bool),
+        in_store=np.array([f.in_store for f in rows], dtype=bool),
+    )
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = asyncio.Lock()
+
+
+async def get_catalog() -> Catalog:
+    """
+    Devuelve el catálogo en memoria, reconstruyéndolo sólo si cambió la versión en Redis.
+    """
+    global _catalog
+    version = await get_catalog_version()
+    if _catalog is not None and _catalog.version == version:
+        return _catalog
+
+    async with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            names = await get_registered_supermarkets()
+            _catalog = build_catalog(version, names, await fetch_features_bulk(names))
+    return _catalog
+
+
+def score(catalog: Catalog, weights: RankingWeights) -> np.ndarray:
+    """
+    Mismo puntaje que redis_crud.score_promotion, ponderado por componente.
+    """
+    return np.round(
+        weights.cap * catalog.cap_points
+        + weights.percentage * catalog.percentage_points
+        + weights.installments * 10 * catalog.installments,
+        2,
+    )
+
+
+async def build_mask(catalog: Catalog, filtro: RankingFilter) -> np.ndarray:
+    mask = np.ones(len(catalog.members), dtype=bool)
+    if filtro.supermarkets:
+        mask &= np.isin(catalog.supermarkets, [s.lower() for s in filtro.supermarkets])
+    if filtro.channel == "online":
+        mask &= catalog.online
+    elif filtro.channel == "tienda":
+        mask &= catalog.in_store
+    if filtro.wallets:
+        mask &= np.isin(catalog.members, list(await find_wallet_members(filtro.wallets)))
+    return mask
+
+
+def top_k(scores: np.ndarray, mask: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los k mejores puntajes dentro de la máscara, de mayor a menor.
+    """
+    candidates = np.flatnonzero(mask)
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+async def rank_discounts(weights: RankingWeights, filtro: RankingFilter, limit: int = 5) -> list[dict]:
+    catalog = await get_catalog()
+    indices = top_k(score(catalog, weights), await build_mask(catalog, filtro), limit)
+    return await group_members_by_supermarket(catalog.members[indices].tolist())
@@ -1,248 +1,968 @@
 from datetime import datetime, timezone
+from dataclasses import dataclass
+import asyncio
+import hashlib
 import json
-import redis
+import orjson
+import re
+import redis.asyncio as redis
+from redis.exceptions import WatchError
 import os
 from dotenv import load_dotenv
 from typing import Optional, List, Dict
 from collections import defaultdict
-import re
+
+from backend.ingest import extract_features
+from backend.models import PromoFeatures
+from backend.wallets import WalletMatcher, default_matcher
 
 load_dotenv()
 
 # Configuración de la conexión a Redis
 redis_host = os.getenv("REDIS_HOST")
-redis_port = os.getenv("REDIS_PORT")
+redis_port = os.getenv("REDIS_PORT", "6379")
 redis_username = os.getenv("REDIS_USER_NAME")
 redis_password = os.getenv("PASS_REDIS")
+redis_max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+redis_pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
 
-try:
-    r = redis.Redis(
-        host=redis_host,
-        port=int(redis_port),
-        decode_responses=True,
-        username=redis_username,
-        password=redis_password,
-    )
-    r.ping()  # Verificar si Redis está disponible
-    print("✅ Conectado a Redis correctamente.")
+# Pool único compartido por promociones y tasas (main.py reutiliza `r`).
+# Si se agotan las conexiones, los requests esperan hasta `redis_pool_timeout`
+# en lugar de fallar de inmediato.
+pool = redis.BlockingConnectionPool(
+    host=redis_host,
+    port=int(redis_port),
+    decode_responses=True,
+    username=redis_username,
+    password=redis_password,
+    max_connections=redis_max_connections,
+    timeout=redis_pool_timeout,
+)
+r = redis.Redis(connection_pool=pool)
 
-except Exception as e:
-    print(f"❌ Error al conectar con Redis: {e}")
 
-# 📥 Save promotions for a supermarket
-def save_promotions(supermarket: str, promotions: List[dict]) -> None:
+async def check_connection() -> bool:
     """
-    Stores promotions for a supermarket in a structured Redis key.
-    Fields:
-      - promotions: JSON string
-      - updated_at: ISO 8601 timestamp
+    Verifica que Redis esté disponible. Se llama al iniciar la app.
     """
-    key = f"promo:{supermarket.lower()}"
+    try:
+        await r.ping()
+        print("✅ Conectado a Redis correctamente.")
+        return True
+    except Exception as e:
+        print(f"❌ Error al conectar con Redis: {e}")
+        return False
+
+
+async def close_connection() -> None:
+    """
+    Cierra el cliente y libera las conexiones del pool.
+    """
+    await r.aclose()
+    await pool.disconnect()
+
+# 🗂️ Claves de índices derivados (fuera de "promo:*" para no mezclarse con los datos)
+WALLET_INDEX_PREFIX = "idx:wallet:"           # slug de billetera canónica (backend.wallets) -> {"<super>:<id>"}
+WALLET_TOKENS_PREFIX = "idx:wallet_tokens:"   # supermercado -> slugs de billeteras que aportó
+WALLET_NAMES_KEY = "idx:wallet_names"         # slug de billetera -> nombre a mostrar
+TOP_DISCOUNTS_KEY = "idx:top"                 # zset "<super>:<id>" -> score
+SUPERMARKETS_KEY = "idx:supermarkets"         # set de supermercados guardados
+CATALOG_VERSION_KEY = "idx:catalog_version"   # se incrementa en cada escritura
+INDEX_VERSION_KEY = "idx:version"
+INDEX_VERSION = "15"
+
+# 📄 Respuestas ya serializadas de las lecturas más frecuentes (ver materialize_views)
+VIEW_SUPERMARKET_PREFIX = "view:supermarket:"  # supermercado -> JSON de su lista "discounts"
+VIEW_TOP_KEY = "view:top"                     # {"top_discounts": [...]} con DEFAULT_TOP_LIMIT
+VIEW_WALLETS_KEY = "view:wallets"             # lista de /wallets
+VIEW_SUPERMARKETS_KEY = "view:supermarkets"   # lista de /supermarkets
+VIEW_ETAGS_KEY = "view:etags"                 # clave de cada vista -> ETag (hash de su contenido)
+VIEW_VERSIONS_KEY = "view:versions"           # clave de cada vista -> idx:catalog_version con la que se armó
+DEFAULT_TOP_LIMIT = 5
+
+# 🏷️ Una promo por hash, con id estable (ver _promo_id); promo:<super> guarda el orden
+PROMO_RECORD_PREFIX = "promo_item:"           # promo_item:<super>:<id> -> campos de la promo
+
+# 🧾 Registro de cambios por supermercado (sólo cuando una escritura cambia algo)
+CHANGES_PREFIX = "changes:"                   # lista de diffs, el más reciente primero
+CHANGE_LOG_LENGTH = 100
+
+# ⚖️ Textos legales, guardados una sola vez por contenido
+LEGAL_TEXT_PREFIX = "legal:text:"             # id (hash del texto normalizado) -> texto
+LEGAL_SUMMARY_PREFIX = "legal:summary:"       # <versión>:<id> -> resumen para el consumidor
+LEGAL_SUMMARY_VERSION = "1"                   # subir si cambia el prompt de resumen (openai_agent.SUMMARY_PROMPT)
+SUMMARY_QUEUE_KEY = "idx:summary_pending"     # ids de legales escritos que pueden no tener resumen
+LEGAL_MIN_SUMMARY_LENGTH = 80                 # más corto (o sólo una URL, como en Coto) no se resume
+LEGAL_IDS_PREFIX = "idx:legales:"             # supermercado -> ids de legales que usan sus promos
+LEGAL_REFS_KEY = "idx:legal_refs"             # id de legal -> cuántos supermercados lo usan
+# Un legal que ya no usa ninguna promo (y su resumen) vence en este tiempo; mientras se use no vence
+LEGAL_TEXT_TTL = int(os.getenv("LEGAL_TEXT_TTL", str(14 * 24 * 3600)))
+
+
+def normalize_legal_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def legal_id(text: str) -> str:
+    """
+    Id de un texto legal: hash del texto normalizado, así textos iguales
+    (salvo espacios) comparten id aunque aparezcan en muchas promociones.
+    """
+    return hashlib.sha256(normalize_legal_text(text).encode("utf-8")).hexdigest()[:16]
+
+
+def is_summarizable(text: Optional[str]) -> bool:
+    """
+    Si un legal es texto que vale la pena resumir: no sólo una URL ni algo demasiado corto.
+    """
+    text = normalize_legal_text(text or "")
+    return len(text) >= LEGAL_MIN_SUMMARY_LENGTH and not re.fullmatch(r"https?://\S+", text)
+
+
+def legal_summary_key(lid: str) -> str:
+    return f"{LEGAL_SUMMARY_PREFIX}{LEGAL_SUMMARY_VERSION}:{lid}"
+
+
+def _externalize_legales(promo: dict, legal_texts: Dict[str, str]) -> dict:
+    """
+    Copia de la promo que referencia sus legales por `legales_id` en lugar de
+    incluir el texto; el texto queda en `legal_texts` para guardarlo aparte.
+    """
+    legales = promo.get("legales")
+    if not legales:
+        return promo
+    lid = legal_id(legales)
+    legal_texts[lid] = legales
+    stored = {k: v for k, v in promo.items() if k != "legales"}
+    stored["legales_id"] = lid
+    return stored
+
+
+def _strip_derived(promo: dict) -> dict:
+    """
+    Saca los campos que se agregan al leer (`id`, `legales_resumen`, y `legales_id` si
+    vino también el texto), para que reescribir lo que devolvió la API no cambie
+    la huella ni se guarde duplicado.
+    """
+    derived = {"id", "legales_resumen"}
+    if promo.get("legales") is not None:
+        derived.add("legales_id")
+    if not derived.intersection(promo):
+        return promo
+    return {k: v for k, v in promo.items() if k not in derived}
+
+
+async def fetch_legal_texts(ids) -> Dict[str, str]:
+    """
+    Textos legales por id, en un solo MGET.
+    """
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    texts = await r.mget([f"{LEGAL_TEXT_PREFIX}{i}" for i in ids])
+    return {i: t for i, t in zip(ids, texts) if t is not None}
+
+
+async def _attach_legales(promotions: List[dict]) -> None:
+    """
+    Completa `legales` (y `legales_resumen`, si ya se resumió) en las promos que
+    sólo traen `legales_id`. Textos y resúmenes salen del mismo round trip.
+    `legales_id` es un detalle del almacenamiento: se saca al reemplazarlo por el texto.
+    """
+    ids = list({p["legales_id"] for p in promotions if p.get("legales_id")})
+    if not ids:
+        return
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.mget([f"{LEGAL_TEXT_PREFIX}{i}" for i in ids])
+        pipe.mget([legal_summary_key(i) for i in ids])
+        texts, summaries = await pipe.execute()
+    texts = dict(zip(ids, texts))
+    summaries = dict(zip(ids, summaries))
+    for p in promotions:
+        lid = p.get("legales_id")
+        if texts.get(lid) is not None:
+            p["legales"] = texts[lid]
+            del p["legales_id"]
+        # Un resumen de algo que no es texto legal (p. ej. sólo una URL) sería inventado
+        if summaries.get(lid) is not None and is_summarizable(texts.get(lid)):
+            p["legales_resumen"] = summaries[lid]
+
+
+def promotions_fingerprint(promotions: List[dict]) -> str:
+    """
+    Huella de la lista normalizada de promociones: si no cambia, la escritura es un no-op.
+    """
+    crudo = json.dumps(promotions, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def _promo_hashes(promotions: List[dict]) -> Dict[str, str]:
+    """
+    Identidad de cada promo (medio de pago, descuento, canal) -> hash de su contenido.
+    Las identidades repetidas se distinguen por orden de aparición.
+    """
+    hashes: Dict[str, str] = {}
+    for promo in promotions:
+        base = " | ".join(
+            str(promo.get(campo) or "") for campo in ("medio_pago", "descuento", "aplica_en")
+        )
+        identidad, n = base, 1
+        while identidad in hashes:
+            n += 1
+            identidad = f"{base}#{n}"
+        contenido = json.dumps(promo, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        hashes[identidad] = hashlib.sha256(contenido).hexdigest()[:16]
+    return hashes
+
+
+def diff_promotions(old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> Dict[str, List[str]]:
+    return {
+        "added": [i for i in new_hashes if i not in old_hashes],
+        "removed": [i for i in old_hashes if i not in new_hashes],
+        "changed": [i for i in new_hashes if i in old_hashes and old_hashes[i] != new_hashes[i]],
+    }
+
+
+def _wallet_slugs(medio_pago: str) -> Dict[str, str]:
+    """
+    Billeteras canónicas (slug -> nombre) de un medio de pago,
+    p. ej. "Visa Galicia MODO" -> {visa: Visa, galicia: Galicia, modo: MODO}.
+    """
+    return default_matcher.wallets_in(medio_pago)
+
+
+def _promo_id(identity: str) -> str:
+    """
+    Id estable de una promo: hash de su identidad (ver _promo_hashes), así una
+    promo conserva su id entre ingestas aunque cambien su tope o sus detalles.
+    """
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:12]
+
+
+def _record_key(name: str, promo_id: str) -> str:
+    return f"{PROMO_RECORD_PREFIX}{name}:{promo_id}"
+
+
+def _encode_record(promo: dict, features: PromoFeatures) -> Dict[str, str]:
+    # Cada campo en JSON para conservar tipos y nulos (leer y reescribir debe dar la misma huella)
+    record = {k: json.dumps(v, ensure_ascii=False) for k, v in promo.items()}
+    record["_features"] = features.model_dump_json()
+    return record
+
+
+def _decode_record(promo_id: str, raw: Dict[str, str]) -> dict:
+    promo = {k: json.loads(v) for k, v in raw.items() if not k.startswith("_")}
+    promo["id"] = promo_id
+    return promo
+
+
+async def _write_promotions(
+    supermarket: str,
+    promotions: List[dict],
+    updated_at: Optional[str] = None,
+    force: bool = False,
+) -> bool:
+    """
+    Escribe las promociones de un supermercado junto con sus índices derivados,
+    en una sola transacción:
+      - promo:<super>            metadatos: ids (orden de la lista), updated_at,
+                                 fingerprint y promo_hashes (para detectar cambios)
+      - promo_item:<super>:<id>  una promo por hash (campos en JSON + _features de backend.ingest);
+                                 el id es estable (_promo_id), y sólo se escriben las
+                                 promos agregadas y los campos que cambiaron
+      - idx:wallet:<slug>        set de "<super>:<id>" cuyo medio_pago incluye esa billetera canónica
+      - idx:wallet_tokens:<super> slugs aportados, para poder limpiar en la próxima escritura
+      - idx:wallet_names         slug -> nombre de la billetera (para /wallets)
+      - idx:top                  ranking global "<super>:<id>" -> score_promotion(promo)
+      - idx:supermarkets         registro de supermercados (evita KEYS promo:* en las lecturas)
+      - idx:catalog_version      contador para invalidar lo que se cachea en memoria (ranking)
+      - legal:text:<id>          texto legal por contenido; las promos guardan sólo `legales_id`
+      - idx:summary_pending      ids de esos legales, para que services/summary_service los resuma
+      - idx:legales:<super>      ids de legales que usa el supermercado, e idx:legal_refs (id -> cuántos
+                                 supermercados lo usan): los que dejan de usarse vencen (_release_legales)
+      - changes:<super>          diff por promo (added/removed/changed) de cada escritura
+    Si la huella de las promociones no cambió no se escribe nada (ni updated_at,
+    ni índices, ni versión del catálogo) y devuelve False, salvo con `force`,
+    que reescribe todo desde cero (reindexado y migración del formato anterior).
+    El diff se calcula con WATCH sobre promo:<super>: si otro escritor (un job,
+    PUT /update/promotion, otro worker en ensure_indexes) lo cambia en el medio,
+    la transacción no se aplica y se vuelve a calcular sobre lo nuevo.
+    """
+    name = supermarket.lower()
+    promotions = [_strip_derived(p) for p in promotions]
+    async with r.pipeline(transaction=True) as tx:
+        while True:
+            try:
+                await tx.watch(f"promo:{name}", f"{WALLET_TOKENS_PREFIX}{name}", f"{LEGAL_IDS_PREFIX}{name}")
+                written, released = await _write_promotions_watched(tx, supermarket, promotions, updated_at, force)
+                break
+            except WatchError:
+                print(f"🔁 '{supermarket}' cambió mientras se escribía, reintentando...")
+    await _release_legales(released)
+    return written
+
+
+async def _write_promotions_watched(
+    tx,
+    supermarket: str,
+    promotions: List[dict],
+    updated_at: Optional[str],
+    force: bool,
+) -> tuple:
+    # `tx` ya tiene WATCH sobre promo:<super>, sus tokens y sus legales; las lecturas van por otra conexión.
+    # Devuelve (si escribió, ids de legales que el supermercado dejó de usar)
+    name = supermarket.lower()
+    key = f"promo:{name}"
+    tokens_key = f"{WALLET_TOKENS_PREFIX}{name}"
+    legal_ids_key = f"{LEGAL_IDS_PREFIX}{name}"
+
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hkeys(key)
+        pipe.smembers(tokens_key)
+        pipe.hmget(key, "fingerprint", "promo_hashes")
+        pipe.smembers(legal_ids_key)
+        fields, old_tokens, (old_fingerprint, old_hashes_raw), old_legales = await pipe.execute()
+
+    fingerprint = promotions_fingerprint(promotions)
+    if fingerprint == old_fingerprint and not force:
+        print(f"⏭️ Sin cambios en '{supermarket}', no se reescribe.")
+        return False, []
+
+    old_hashes = json.loads(old_hashes_raw) if old_hashes_raw else {}
+    new_hashes = _promo_hashes(promotions)
+    changes = diff_promotions(old_hashes, new_hashes)
+
+    legal_texts: Dict[str, str] = {}
+    ids = [_promo_id(identity) for identity in new_hashes]
+    records = {
+        pid: _encode_record(_externalize_legales(p, legal_texts), extract_features(p))
+        for pid, p in zip(ids, promotions)
+    }
+    old_ids = [_promo_id(identity) for identity in old_hashes]
+
+    if force:
+        # Miembros "<super>:<n>" del formato anterior (campos item:<n> en promo:<super>)
+        removed = old_ids + [f.split(":", 1)[1] for f in fields if f.startswith("item:")]
+        written = {pid: (records[pid], []) for pid in ids}
+    else:
+        removed = [_promo_id(i) for i in changes["removed"]]
+        written = {_promo_id(i): (records[_promo_id(i)], []) for i in changes["added"]}
+        changed = [_promo_id(i) for i in changes["changed"]]
+        if changed:
+            async with r.pipeline(transaction=False) as pipe:
+                for pid in changed:
+                    pipe.hgetall(_record_key(name, pid))
+                for pid, old in zip(changed, await pipe.execute()):
+                    new = records[pid]
+                    diff = {k: v for k, v in new.items() if old.get(k) != v}
+                    written[pid] = (diff, [k for k in old if k not in new])
+
+    removed_members = [f"{name}:{pid}" for pid in removed]
+    written_legales = {
+        lid for lid in (json.loads(rec["legales_id"]) for rec, _ in written.values() if "legales_id" in rec)
+        if is_summarizable(legal_texts.get(lid))
+    }
     payload = {
-        "promotions": json.dumps(promotions),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "ids": json.dumps(ids),
+        "fingerprint": fingerprint,
+        "promo_hashes": json.dumps(new_hashes),
+        "updated_at": updated_at or datetime.now(timezone.utc).isoformat(),
     }
-    r.hset(key, mapping=payload)
-    print(f"✅ Promotions saved for '{supermarket}'")
+    stale_fields = [f for f in fields if f not in payload]
+
+    released = [lid for lid in old_legales if lid not in legal_texts]
+
+    tx.multi()
+    for lid, text in legal_texts.items():
+        tx.set(f"{LEGAL_TEXT_PREFIX}{lid}", text, nx=True)
+        # Puede venir del cache de legales de los scrapers o de un supermercado que lo dejó de usar
+        tx.persist(f"{LEGAL_TEXT_PREFIX}{lid}")
+        if lid not in old_legales:
+            tx.hincrby(LEGAL_REFS_KEY, lid, 1)
+            tx.persist(legal_summary_key(lid))
+    for lid in released:
+        tx.hincrby(LEGAL_REFS_KEY, lid, -1)
+    tx.delete(legal_ids_key)
+    if legal_texts:
+        tx.sadd(legal_ids_key, *legal_texts)
+    if written_legales:
+        tx.sadd(SUMMARY_QUEUE_KEY, *written_legales)
+
+    if force:
+        for pid in old_ids:
+            tx.delete(_record_key(name, pid))
+    else:
+        for pid in removed:
+            tx.delete(_record_key(name, pid))
+    for pid, (mapping, deleted) in written.items():
+        if mapping:
+            tx.hset(_record_key(name, pid), mapping=mapping)
+        if deleted:
+            tx.hdel(_record_key(name, pid), *deleted)
+
+    tx.hset(key, mapping=payload)
+    tx.sadd(SUPERMARKETS_KEY, name)
+    if stale_fields:
+        tx.hdel(key, *stale_fields)
+
+    if removed_members:
+        for token in old_tokens:
+            tx.srem(f"{WALLET_INDEX_PREFIX}{token}", *removed_members)
+        tx.zrem(TOP_DISCOUNTS_KEY, *removed_members)
+    tx.delete(tokens_key)
+
+    # El medio de pago es parte de la identidad: una promo "changed" no cambia sus billeteras
+    new_tokens: Dict[str, str] = {}
+    for pid, promo in zip(ids, promotions):
+        wallets = _wallet_slugs(promo.get("medio_pago") or "")
+        new_tokens.update(wallets)
+        if pid in written:
+            for slug in wallets:
+                tx.sadd(f"{WALLET_INDEX_PREFIX}{slug}", f"{name}:{pid}")
+    if new_tokens:
+        tx.sadd(tokens_key, *new_tokens)
+        tx.hset(WALLET_NAMES_KEY, mapping=new_tokens)
+
+    if written:
+        tx.zadd(TOP_DISCOUNTS_KEY, {
+            f"{name}:{pid}": score_promotion(PromoFeatures.model_validate_json(records[pid]["_features"]))
+            for pid in written
+        })
+
+    if any(changes.values()):
+        tx.lpush(f"{CHANGES_PREFIX}{name}", json.dumps({
+            "at": payload["updated_at"],
+            "fingerprint": fingerprint,
+            **changes,
+        }))
+        tx.ltrim(f"{CHANGES_PREFIX}{name}", 0, CHANGE_LOG_LENGTH - 1)
+
+    tx.incr(CATALOG_VERSION_KEY)
+    await tx.execute()
+    return True, released
+
+
+async def _release_legales(lids: List[str]) -> None:
+    """
+    Los legales (y sus resúmenes) que ya no usa ningún supermercado vencen en
+    LEGAL_TEXT_TTL. Con WATCH sobre idx:legal_refs: si otra escritura empieza a
+    usar uno en el medio, se vuelve a mirar antes de ponerle vencimiento.
+    """
+    if not lids:
+        return
+    async with r.pipeline(transaction=True) as tx:
+        while True:
+            try:
+                await tx.watch(LEGAL_REFS_KEY)
+                counts = await tx.hmget(LEGAL_REFS_KEY, lids)
+                unused = [lid for lid, count in zip(lids, counts) if int(count or 0) <= 0]
+                if not unused:
+                    return
+                tx.multi()
+                tx.hdel(LEGAL_REFS_KEY, *unused)
+                for lid in unused:
+                    tx.expire(f"{LEGAL_TEXT_PREFIX}{lid}", LEGAL_TEXT_TTL)
+                    tx.expire(legal_summary_key(lid), LEGAL_TEXT_TTL)
+                await tx.execute()
+                return
+            except WatchError:
+                continue
+
+
+async def _release_unreferenced_legales() -> None:
+    """
+    Pone vencimiento a los legales y resúmenes sin vencimiento que no usa ninguna promo
+    (guardados antes de que existiera idx:legal_refs). Recorre legal:* con SCAN.
+    """
+    keys = [key for pattern in (f"{LEGAL_TEXT_PREFIX}*", f"{LEGAL_SUMMARY_PREFIX}*") async for key in r.scan_iter(pattern, count=500)]
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.ttl(key)
+        ttls = await pipe.execute()
+    candidatos = list({key.rsplit(":", 1)[1] for key, ttl in zip(keys, ttls) if ttl == -1})
+    for i in range(0, len(candidatos), 500):
+        await _release_legales(candidatos[i:i + 500])
+
+
+async def _load_stored_promotions(supermarket: str) -> Optional[tuple]:
+    """
+    (promociones con legales, updated_at) de un supermercado, leyendo tanto el
+    formato actual como el anterior (lista entera en el campo `promotions`).
+    """
+    promotions_raw, updated_at = await r.hmget(f"promo:{supermarket}", "promotions", "updated_at")
+    if promotions_raw:
+        promotions = json.loads(promotions_raw)
+        await _attach_legales(promotions)
+        return promotions, updated_at
+    data = (await fetch_promotions_bulk([supermarket]))[0]
+    return (data["promotions"], data["updated_at"]) if data else None
+
+
+async def ensure_indexes() -> None:
+    """
+    Reconstruye los índices derivados (y migra el formato de almacenamiento) a
+    partir de los datos guardados si fueron generados con otra versión (o nunca).
+    Se llama al iniciar la app.
+    Es el único lugar que recorre el keyspace (con SCAN, no KEYS); el resto de
+    las lecturas usan el registro idx:supermarkets.
+    """
+    if await r.get(INDEX_VERSION_KEY) == INDEX_VERSION:
+        return
+
+    async for key in r.scan_iter("promo:*"):
+        try:
+            # Se restauran los legales para que la huella coincida con la de la ingesta original
+            # (_write_promotions descarta id/legales_id/legales_resumen agregados al leer)
+            stored = await _load_stored_promotions(key.replace("promo:", ""))
+            if stored is None:
+                continue
+            promotions, updated_at = stored
+            await _write_promotions(key.replace("promo:", ""), promotions, updated_at=updated_at, force=True)
+        except Exception as e:
+            print(f"⚠️ Error reindexando {key}: {e}")
+
+    await _release_unreferenced_legales()
+    await materialize_views()
+    await r.set(INDEX_VERSION_KEY, INDEX_VERSION)
+    print("🗂️ Índices de promociones reconstruidos.")
+
+
+# 📥 Save promotions for a supermarket
+async def save_promotions(supermarket: str, promotions: List[dict]) -> bool:
+    """
+    Stores promotions for a supermarket, one Redis hash per promotion
+    (promo_item:<super>:<id>) plus promo:<super> with:
+      - ids: JSON list with the order of the promotions
+      - updated_at: ISO 8601 timestamp
+      - fingerprint / promo_hashes: used to write only what changed (see _write_promotions)
+    Returns False if the stored promotions were already identical (nothing written).
+    """
+    if await _write_promotions(supermarket, promotions):
+        print(f"✅ Promotions saved for '{supermarket}'")
+        await materialize_views([supermarket])
+        return True
+    return False
+
+
+# 🏪 Registered supermarkets
+async def get_registered_supermarkets() -> List[str]:
+    """
+    Returns the (lowercase) names of all supermarkets stored in Redis.
+    """
+    return sorted(await r.smembers(SUPERMARKETS_KEY))
+
+
+# 📦 Bulk reads (pipelined: one round trip for the metadata, one for the records)
+async def fetch_ids_bulk(supermarkets: List[str]) -> List[Optional[dict]]:
+    """
+    Fetches the metadata of several supermarkets in one pipeline.
+    Returns one entry per requested name: {"ids": [...], "updated_at": str}, or None if missing.
+    """
+    async with r.pipeline(transaction=False) as pipe:
+        for supermarket in supermarkets:
+            pipe.hmget(f"promo:{supermarket.lower()}", "ids", "updated_at")
+        rows = await pipe.execute()
+
+    results: List[Optional[dict]] = []
+    for supermarket, (ids_raw, updated_at) in zip(supermarkets, rows):
+        try:
+            results.append({"ids": json.loads(ids_raw), "updated_at": updated_at} if ids_raw else None)
+        except Exception as e:
+            print(f"⚠️ Error parsing data for {supermarket}: {e}")
+            results.append(None)
+    return results
+
+
+def _storage_fields(fields: List[str], with_legales: bool) -> List[str]:
+    """
+    Record fields to HMGET for a projection: `id` is the key itself and the
+    legal text/summary are resolved from `legales_id`.
+    """
+    read = [f for f in fields if f not in ("id", "legales", "legales_resumen")]
+    if with_legales and ("legales" in fields or "legales_resumen" in fields):
+        read.append("legales_id")
+    return read
+
+
+def _project(promo: dict, fields: List[str]) -> dict:
+    return {k: v for k, v in promo.items() if k == "id" or k in fields}
+
+
+async def fetch_promotions_bulk(
+    supermarkets: List[str],
+    with_legales: bool = True,
+    fields: Optional[List[str]] = None,
+) -> List[Optional[dict]]:
+    """
+    Fetches the stored promotions of several supermarkets.
+    Returns one entry per requested name, in the same order:
+      {"promotions": [...], "updated_at": str}, or None if missing/invalid.
+    With `fields` only those fields of each record are read (plus `id`).
+    With `with_legales` the legal texts are resolved from their ids (one extra round trip).
+    """
+    metas = await fetch_ids_bulk(supermarkets)
+    read_fields = _storage_fields(fields, with_legales) if fields else None
+
+    async with r.pipeline(transaction=False) as pipe:
+        for supermarket, meta in zip(supermarkets, metas):
+            for pid in (meta["ids"] if meta else []):
+                if read_fields is None:
+                    pipe.hgetall(_record_key(supermarket.lower(), pid))
+                elif read_fields:
+                    pipe.hmget(_record_key(supermarket.lower(), pid), *read_fields)
+        rows = iter(await pipe.execute())
+
+    results: List[Optional[dict]] = []
+    for meta in metas:
+        if not meta:
+            results.append(None)
+            continue
+        promotions = []
+        for pid in meta["ids"]:
+            if read_fields is None:
+                raw = next(rows)
+            else:
+                values = next(rows) if read_fields else []
+                raw = {f: v for f, v in zip(read_fields, values) if v is not None}
+            promotions.append(_decode_record(pid, raw))
+        results.append({"promotions": promotions, "updated_at": meta["updated_at"]})
+
+    all_promotions = [p for data in results if data for p in data["promotions"]]
+    if with_legales:
+        await _attach_legales(all_promotions)
+    if fields:
+        for data in results:
+            if data:
+                data["promotions"] = [_project(p, fields) for p in data["promotions"]]
+    return results
+
+
+async def fetch_items_bulk(
+    members: List[str],
+    fields: Optional[List[str]] = None,
+    with_legales: bool = True,
+) -> List[Optional[dict]]:
+    """
+    Fetches individual promotions by index member ("<super>:<id>") in one pipeline.
+    Returns one entry per member, in the same order (None if it no longer exists).
+    With `fields` only those fields are read (plus `id`); with `with_legales`
+    the legal texts are resolved from their ids.
+    """
+    read_fields = _storage_fields(fields, with_legales) if fields else None
+    async with r.pipeline(transaction=False) as pipe:
+        for member in members:
+            supermarket, promo_id = member.rsplit(":", 1)
+            if read_fields is None:
+                pipe.hgetall(_record_key(supermarket, promo_id))
+            else:
+                # EXISTS además de los campos, para distinguir una promo borrada de una sin esos campos
+                pipe.exists(_record_key(supermarket, promo_id))
+                if read_fields:
+                    pipe.hmget(_record_key(supermarket, promo_id), *read_fields)
+        rows = iter(await pipe.execute())
+
+    promotions: List[Optional[dict]] = []
+    for member in members:
+        promo_id = member.rsplit(":", 1)[1]
+        if read_fields is None:
+            raw = next(rows)
+            promotions.append(_decode_record(promo_id, raw) if raw else None)
+            continue
+        exists = next(rows)
+        values = next(rows) if read_fields else []
+        raw = {f: v for f, v in zip(read_fields, values) if v is not None}
+        promotions.append(_decode_record(promo_id, raw) if exists else None)
+
+    if with_legales:
+        await _attach_legales([p for p in promotions if p])
+    if fields:
+        promotions = [_project(p, fields) if p else None for p in promotions]
+    return promotions
+
+
+async def fetch_features_bulk(supermarkets: List[str]) -> List[Optional[Dict[str, PromoFeatures]]]:
+    """
+    Fetches the pre-parsed features (see backend.ingest) of several supermarkets.
+    Returns one dict per requested name, promotion id -> features in list order (None if missing).
+    """
+    metas = await fetch_ids_bulk(supermarkets)
+    async with r.pipeline(transaction=False) as pipe:
+        for supermarket, meta in zip(supermarkets, metas):
+            for pid in (meta["ids"] if meta else []):
+                pipe.hget(_record_key(supermarket.lower(), pid), "_features")
+        rows = iter(await pipe.execute())
+
+    results: List[Optional[Dict[str, PromoFeatures]]] = []
+    for meta in metas:
+        if not meta:
+            results.append(None)
+            continue
+        features = {}
+        for pid in meta["ids"]:
+            raw = next(rows)
+            if raw:
+                features[pid] = PromoFeatures.model_validate_json(raw)
+        results.append(features)
+    return results
 
 
 # 📤 Retrieve all promotions (all supermarkets)
-def get_all_promotions() -> List[Dict]:
+async def get_all_promotions() -> List[Dict]:
     """
     Retrieves promotions from all supermarkets stored in Redis.
     """
+    names = await get_registered_supermarkets()
     results = []
-    for key in r.scan_iter("promo:*"):
-        data = r.hgetall(key)
+    for name, data in zip(names, await fetch_promotions_bulk(names)):
         if data:
-            try:
-                promotions = json.loads(data.get("promotions", "[]"))
-                results.append({
-                    "supermarket": key.replace("promo:", ""),
-                    "updated_at": data.get("updated_at"),
-                    "promotions": promotions
-                })
-            except Exception as e:
-                print(f"⚠️ Error parsing {key}: {e}")
+            results.append({
+                "supermarket": name,
+                "updated_at": data["updated_at"],
+                "promotions": data["promotions"]
+            })
     return results
 
 
 # 🔍 Get promotions by supermarket
-def get_promotions_by_supermarket(supermarket: str) -> Optional[List[dict]]:
+async def get_promotions_by_supermarket(supermarket: str) -> Optional[List[dict]]:
     """
     Returns promotions for a given supermarket name, formatted like other promotion results.
     """
-    key = f"promo:{supermarket.lower()}"
-    data = r.hgetall(key)
-
-    if data:
-        try:
-            promotions = json.loads(data.get("promotions", "[]"))
-            return [{
-                "supermarket": supermarket,
-                "discounts": promotions
-            }]
-        except Exception as e:
-            print(f"⚠️ Error parsing data for {supermarket}: {e}")
-            return None
-
-    return None
+    return await get_promotions_by_supermarket_names([supermarket]) or None
 
 
-def get_promotions_by_supermarket_names(supermarkets: List[str]) -> List[dict]:
+async def get_promotions_by_supermarket_names(supermarkets: List[str]) -> List[dict]:
     results: List[dict] = []
-    for market in supermarkets:
-        promos = get_promotions_by_supermarket(market)
-        if promos:
-            results.extend(promos)
+    for market, data in zip(supermarkets, await fetch_promotions_bulk(supermarkets)):
+        if data:
+            results.append({
+                "supermarket": market,
+                "discounts": data["promotions"]
+            })
     return results
 
 
 # 🔄 Update promotions (overwrite only if exists)
-def update_promotions(supermarket: str, new_promotions: List[dict]) -> bool:
+async def update_promotions(supermarket: str, new_promotions: List[dict]) -> bool:
     """
     Updates the promotions list for a given supermarket.
-    Returns True if key exists and was updated, False otherwise.
+    Returns True if key exists (a no-op when nothing changed), False otherwise.
     """
     key = f"promo:{supermarket.lower()}"
-    if r.exists(key):
-        payload = {
-            "promotions": json.dumps(new_promotions),
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        r.hset(key, mapping=payload)
-        print(f"🔄 Promotions updated for '{supermarket}'")
+    if await r.exists(key):
+        if await _write_promotions(supermarket, new_promotions):
+            print(f"🔄 Promotions updated for '{supermarket}'")
+            await materialize_views([supermarket])
         return True
     else:
         print(f"⚠️ Cannot update: '{supermarket}' not found in Redis.")
         return False
     
-def get_promotions_by_wallet_names(billeteras: List[str]) -> List[dict]:
-    resultados = []
-    keys = r.keys("promo:*")
+async def get_change_log(supermarket: str, limit: int = 20) -> List[dict]:
+    """
+    Últimos diffs registrados para un supermercado (el más reciente primero).
+    """
+    rows = await r.lrange(f"{CHANGES_PREFIX}{supermarket.lower()}", 0, limit - 1)
+    return [json.loads(row) for row in rows]
 
-    for key in keys:
-        data = r.hget(key, "promotions")
-        if not data:
-            continue
 
-        promociones = json.loads(data)
+async def bump_catalog_version() -> int:
+    """
+    Marca el catálogo como cambiado sin reescribir promociones (p. ej. nuevos resúmenes de legales).
+    """
+    return await r.incr(CATALOG_VERSION_KEY)
 
-        filtradas = [
-            p for p in promociones
-            if any(b.lower() in p["medio_pago"].lower() for b in billeteras)
-        ]
 
-        if filtradas:
-            supermercado = key.split(":")[1]
-            resultados.append({
-                "supermarket": supermercado,
-                "discounts": filtradas
-            })
+async def get_catalog_version() -> int:
+    """
+    Versión actual del catálogo de promociones (cambia con cada escritura).
+    """
+    return int(await r.get(CATALOG_VERSION_KEY) or 0)
 
-    return resultados
 
-def get_all_wallets() -> List[str]:
-    wallets_set = set()
-    keys = r.keys("promo:*")
-    
-    plataformas = {"MODO"}
+@dataclass
+class WalletCatalog:
+    version: int
+    names: Dict[str, str]     # slug -> nombre de las billeteras presentes en el catálogo
+    matcher: WalletMatcher    # diccionario canónico + billeteras descubiertas en el catálogo
 
-    for key in keys:
-        data = r.hget(key, "promotions")
-        if not data:
-            continue
 
-        promociones = json.loads(data)
+_wallet_catalog: Optional[WalletCatalog] = None
+_wallet_catalog_lock = asyncio.Lock()
 
-        for promo in promociones:
-            medio = promo.get("medio_pago")
-            if not medio:
-                continue
 
-            partes = medio.strip().split()
-            plataformas_encontradas = [p for p in partes if p in plataformas]
-            entidad = " ".join([p for p in partes if p not in plataformas])
+async def get_wallet_catalog() -> WalletCatalog:
+    """
+    Billeteras del catálogo y su matcher, reconstruidos sólo si cambió la versión del catálogo.
+    """
+    global _wallet_catalog
+    version = await get_catalog_version()
+    if _wallet_catalog is not None and _wallet_catalog.version == version:
+        return _wallet_catalog
 
-            if entidad:
-                wallets_set.add(entidad.strip())
-            for plataforma in plataformas_encontradas:
-                wallets_set.add(plataforma.strip())
+    async with _wallet_catalog_lock:
+        if _wallet_catalog is None or _wallet_catalog.version != version:
+            supermarkets = await get_registered_supermarkets()
+            slugs = sorted(await r.sunion([f"{WALLET_TOKENS_PREFIX}{s}" for s in supermarkets])) if supermarkets else []
+            names = dict(zip(slugs, await r.hmget(WALLET_NAMES_KEY, slugs))) if slugs else {}
+            names = {slug: name for slug, name in names.items() if name}
+            _wallet_catalog = WalletCatalog(version, names, WalletMatcher.from_dictionary(extra=names))
+    return _wallet_catalog
 
-    return sorted(wallets_set)
 
-def get_all_supermarkets() -> List[str]:
-    keys = r.keys("promo:*")
-    supermercados = set()
+async def find_wallet_members(billeteras: List[str]) -> set:
+    """
+    Miembros "<super>:<id>" que tienen todas las billeteras nombradas en alguna de
+    `billeteras` ("Galicia MODO" -> Galicia y MODO), según el índice idx:wallet:<slug>.
+    Los nombres se normalizan (tildes, mayúsculas, espacios) con el matcher del catálogo.
+    """
+    matcher = (await get_wallet_catalog()).matcher
+    async with r.pipeline(transaction=False) as pipe:
+        for b in billeteras:
+            # Igual que al indexar (_wallet_slugs): billeteras conocidas más el resto del texto
+            slugs = list(matcher.wallets_in(b))
+            if slugs:
+                pipe.sinter(*[f"{WALLET_INDEX_PREFIX}{slug}" for slug in slugs])
+        return set().union(*await pipe.execute())
 
-    for key in keys:
-        try:
-            supermercado = key.split(":")[1]
-            supermercados.add(supermercado.capitalize())
-        except Exception as e:
-            print(f"⚠️ Error leyendo key '{key}': {e}")
 
-    return sorted(list(supermercados))
+async def _member_positions(supermarkets) -> Dict[str, tuple]:
+    """
+    "<super>:<id>" -> (super, posición en su lista guardada), para ordenar miembros.
+    """
+    nombres = sorted(supermarkets)
+    return {
+        f"{nombre}:{pid}": (nombre, i)
+        for nombre, meta in zip(nombres, await fetch_ids_bulk(nombres)) if meta
+        for i, pid in enumerate(meta["ids"])
+    }
 
-def extract_percentage(discount: str) -> int:
-    match = re.search(r"(\d+)\s*%", discount)
-    return int(match.group(1)) if match else 0
 
-def extract_tope_value(tope: str) -> int:
-    # Handles "Tope: $10.000" or similar
-    match = re.search(r"\$?\s*([\d\.]+)", tope.replace(".", "").replace(",", "."))
-    try:
-        return int(float(match.group(1))) if match else 0
-    except:
-        return 0
+async def get_wallet_members(billeteras: List[str]) -> List[str]:
+    """
+    Miembros "<super>:<id>" que tienen alguna de las billeteras (ver find_wallet_members),
+    en el orden guardado de cada supermercado.
+    """
+    candidatos = await find_wallet_members(billeteras)
+    posiciones = await _member_positions({m.rsplit(":", 1)[0] for m in candidatos})
+    return sorted((m for m in candidatos if m in posiciones), key=posiciones.get)
+
+
+async def get_supermarket_members(supermarkets: List[str]) -> List[str]:
+    """
+    Miembros "<super>:<id>" de los supermercados pedidos, en ese orden y en el orden guardado.
+    """
+    names = [s.lower() for s in supermarkets]
+    return [
+        f"{name}:{pid}"
+        for name, meta in zip(names, await fetch_ids_bulk(names)) if meta
+        for pid in meta["ids"]
+    ]
 
-def has_installments(discount: str, details: str) -> bool:
-    return "cuotas sin interés" in discount.lower() or "cuotas sin interés" in details.lower()
 
-def is_no_limit(tope: str) -> bool:
-    return "sin tope" in tope.lower() or "sin límite" in tope.lower()
+async def get_promotions_by_wallet_names(billeteras: List[str]) -> List[dict]:
+    """
+    Devuelve las promociones cuyo medio de pago incluye alguna de las billeteras
+    (sin importar tildes, mayúsculas ni espacios, como los nombres que lista /wallets).
+    """
+    return await group_members_by_supermarket(await get_wallet_members(billeteras))
 
-def get_top_discounts(limit=5) -> list[dict]:
-    keys = r.keys("promo:*")
-    scored_discounts = []
 
-    for key in keys:
-        data = r.hget(key, "promotions")
-        if not data:
-            continue
+SORT_OPTIONS = ("default", "score", "medio_pago")
 
-        promotions = json.loads(data)
-        supermarket = key.split(":")[1]
 
-        for promo in promotions:
-            percent = extract_percentage(promo.get("descuento", ""))
-            tope_val = extract_tope_value(promo.get("tope", ""))
-            cuotas = has_installments(promo.get("descuento", ""), promo.get("detalles", ""))
-            no_limit = is_no_limit(promo.get("tope", ""))
+async def sort_members(members: List[str], sort: str = "default") -> List[str]:
+    """
+    Ordena miembros sin traer las promos completas:
+      - default     orden recibido (el guardado)
+      - score       mayor puntaje de idx:top primero (ZMSCORE, un solo comando)
+      - medio_pago  alfabético, leyendo sólo ese campo
+    """
+    if sort == "score" and members:
+        scores = await r.zmscore(TOP_DISCOUNTS_KEY, members)
+        order = sorted(range(len(members)), key=lambda i: -(scores[i] or 0))
+        return [members[i] for i in order]
+    if sort == "medio_pago" and members:
+        medios = await fetch_items_bulk(members, fields=["medio_pago"], with_legales=False)
+        order = sorted(range(len(members)), key=lambda i: ((medios[i] or {}).get("medio_pago") or "").lower())
+        return [members[i] for i in order]
+    return members
 
-            score = 0
-            if no_limit:
-                score += 30
-            else:
-                score += min(tope_val / 1000, 30)  # Up to 30 pts
 
-            score += min(percent, 30)  # Max 30 for high discount
-            if cuotas:
-                score += 10
+async def get_promotions_page(
+    members: List[str],
+    fields: Optional[List[str]] = None,
+    sort: str = "default",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    labels: Optional[Dict[str, str]] = None,
+) -> dict:
+    """
+    Una página de promociones agrupadas por supermercado. Se ordenan y cortan
+    los miembros antes de leer nada más, y de cada promo de la página se leen
+    sólo `fields` (los legales se resuelven sólo si se piden).
+    `cursor` es el valor de `next_cursor` de la página anterior (ValueError si no es válido).
+    """
+    offset = int(cursor) if cursor else 0
+    if offset < 0:
+        raise ValueError("cursor inválido")
+    ordered = await sort_members(members, sort)
+    end = offset + limit if limit else len(ordered)
+    return {
+        "result": await group_members_by_supermarket(ordered[offset:end], fields, labels),
+        "next_cursor": str(end) if end < len(ordered) else None,
+    }
 
-            scored_discounts.append({
-                "score": round(score, 2),
-                "supermarket": supermarket,
-                "discount": promo
-            })
+async def get_all_wallets() -> List[str]:
+    """
+    Nombres canónicos (ver backend.wallets) de las billeteras presentes en el catálogo.
+    """
+    return sorted((await get_wallet_catalog()).names.values())
+
+async def get_all_supermarkets() -> List[str]:
+    supermercados = {s.capitalize() for s in await get_registered_supermarkets()}
+    return sorted(list(supermercados))
 
-    # Sort by score and take top N
-    top = sorted(scored_discounts, key=lambda x: x["score"], reverse=True)[:limit]
+def score_promotion(features: PromoFeatures) -> float:
+    """
+    Puntaje de una promoción para el ranking de /promotions/top.
+    Se calcula una sola vez al escribir (ver _write_promotions).
+    """
+    score = 0
+    if features.no_limit:
+        score += 30
+    else:
+        score += min((features.cap_amount or 0) / 1000, 30)  # Up to 30 pts
+
+    score += min(features.percentage, 30)  # Max 30 for high discount
+    if features.installments:
+        score += 10
 
+    return round(score, 2)
+
+async def get_top_discounts(limit=5) -> list[dict]:
+    # Top N straight from the precomputed ranking
+    top = await r.zrevrange(TOP_DISCOUNTS_KEY, 0, limit - 1)
+    return await group_members_by_supermarket(top)
+
+async def group_members_by_supermarket(
+    members: List[str],
+    fields: Optional[List[str]] = None,
+    labels: Optional[Dict[str, str]] = None,
+) -> list[dict]:
+    """
+    Fetches the given ranked members (only `fields`, if given) and groups them
+    per supermarket, keeping the ranking order within each group.
+    `labels` maps the stored (lowercase) names to the ones to show.
+    """
+    labels = labels or {}
+    with_legales = not fields or "legales" in fields or "legales_resumen" in fields
     # Group into the desired structure
     grouped = defaultdict(list)
-    for item in top:
-        grouped[item["supermarket"]].append(item["discount"])
+    for member, promo in zip(members, await fetch_items_bulk(members, fields, with_legales)):
+        if promo:
+            name = member.rsplit(":", 1)[0]
+            grouped[labels.get(name, name)].append(promo)
 
     result = []
     for supermarket, discounts in grouped.items():
@@ -252,3 +972,93 @@ def get_top_discounts(limit=5) -> list[dict]:
         })
 
     return result
+
+
+# 📄 Materialized responses
+async def materialize_views(supermarkets: Optional[List[str]] = None) -> None:
+    """
+    Serializes (with orjson) the hot read shapes once per write, so the endpoints
+    can return them as raw bytes without parsing or re-encoding:
+      - view:supermarket:<super>  the "discounts" list of each given supermarket
+                                  (all registered ones when `supermarkets` is None)
+      - view:top                  /promotions/top with the default limit
+      - view:wallets / view:supermarkets
+    Each view gets a content ETag in view:etags, stored in the same transaction.
+    Called after every write that changed something and when legal summaries are added
+    (after bumping idx:catalog_version).
+    Views are tagged in view:versions with the catalog version read before building
+    them, and a view is only replaced by one built from the same or a newer version:
+    with concurrent rebuilds, one that read the catalog earlier can't overwrite a newer view.
+    """
+    version = await get_catalog_version()
+    names = [s.lower() for s in supermarkets] if supermarkets is not None else await get_registered_supermarkets()
+    views = {}
+    for name, data in zip(names, await fetch_promotions_bulk(names)):
+        if data:
+            views[f"{VIEW_SUPERMARKET_PREFIX}{name}"] = orjson.dumps(data["promotions"])
+    views[VIEW_TOP_KEY] = orjson.dumps({"top_discounts": await get_top_discounts(DEFAULT_TOP_LIMIT)})
+    views[VIEW_WALLETS_KEY] = orjson.dumps(await get_all_wallets())
+    views[VIEW_SUPERMARKETS_KEY] = orjson.dumps(await get_all_supermarkets())
+    etags = {k: content_etag(v) for k, v in views.items()}
+
+    async with r.pipeline(transaction=True) as tx:
+        while True:
+            try:
+                await tx.watch(VIEW_VERSIONS_KEY)
+                stored = await tx.hmget(VIEW_VERSIONS_KEY, list(views))
+                fresh = [k for k, v in zip(views, stored) if v is None or int(v) <= version]
+                if not fresh:
+                    return
+                tx.multi()
+                tx.mset({k: views[k] for k in fresh})
+                tx.hset(VIEW_ETAGS_KEY, mapping={k: etags[k] for k in fresh})
+                tx.hset(VIEW_VERSIONS_KEY, mapping={k: version for k in fresh})
+                await tx.execute()
+                return
+            except WatchError:
+                continue
+
+
+def content_etag(body: bytes) -> str:
+    """
+    Strong ETag (quoted) of a response body.
+    """
+    return f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+async def get_view(key: str) -> tuple:
+    """
+    (body, etag) of a materialized response (see materialize_views), in one round trip.
+    Both are None if the view was not built yet.
+    """
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.get(key)
+        pipe.hget(VIEW_ETAGS_KEY, key)
+        body, etag = await pipe.execute()
+    return (body, etag) if body is not None else (None, None)
+
+
+async def get_supermarket_views(supermarkets: List[str]) -> List[Optional[str]]:
+    """
+    Serialized "discounts" list of each supermarket, in one MGET (None if it has no promotions).
+    Views that are missing (evicted, a failed materialize_views, data older than
+    the views) are built from the stored promotions and materialized again.
+    """
+    if not supermarkets:
+        return []
+    views = await r.mget([f"{VIEW_SUPERMARKET_PREFIX}{s.lower()}" for s in supermarkets])
+    missing = list(dict.fromkeys(s.lower() for s, view in zip(supermarkets, views) if view is None))
+    if not missing:
+        return views
+
+    rebuilt = {
+        name: orjson.dumps(data["promotions"]).decode()
+        for name, data in zip(missing, await fetch_promotions_bulk(missing))
+        if data
+    }
+    if rebuilt:
+        try:
+            await materialize_views(list(rebuilt))
+        except Exception as e:
+            print(f"⚠️ Error rematerializando vistas de {list(rebuilt)}: {e}")
+    return [view if view is not None else rebuilt.get(s.lower()) for s, view in zip(supermarkets, views)]
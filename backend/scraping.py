@@ -0,0 +1,96 @@
+import os
+import json
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+
+# Utilidades compartidas por los scrapers (carrefour.py, dia.py, jumbo.py, coto.py, cordiez.py).
+# Cada scraper expone una función async que recibe un BrowserContext; así el
+# orquestador (services/scraping_service.py) puede correrlos todos en paralelo
+# sobre un único navegador, y cada script sigue pudiendo correrse por separado.
+
+# Modo rápido: se abortan los recursos que la extracción no usa.
+# Se desactiva con SCRAPER_FAST_MODE=0 (p. ej. para depurar con headless=False).
+MODO_RAPIDO = os.getenv("SCRAPER_FAST_MODE", "1") != "0"
+
+RECURSOS_BLOQUEABLES = frozenset({"image", "media", "font"})
+
+HOSTS_BLOQUEADOS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "tiktok.com",
+    "criteo.com",
+    "criteo.net",
+    "newrelic.com",
+    "nr-data.net",
+    "onesignal.com",
+)
+
+
+def _host_bloqueado(url):
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith(f".{h}") for h in HOSTS_BLOQUEADOS)
+
+
+async def preparar_pagina(pagina, necesarios=frozenset()):
+    """
+    Configura la página en modo rápido: aborta imágenes, media, fuentes y hosts de
+    tracking, salvo los tipos de recurso que el scraper declare como `necesarios`.
+    """
+    if not MODO_RAPIDO:
+        return
+
+    bloqueados = RECURSOS_BLOQUEABLES - frozenset(necesarios)
+
+    async def _filtrar(route):
+        request = route.request
+        if request.resource_type in bloqueados or _host_bloqueado(request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await pagina.route("**/*", _filtrar)
+
+
+def id_tarjeta(datos):
+    """
+    Hash estable de los datos visibles de una tarjeta (dict, tupla, etc.).
+    """
+    crudo = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()[:16]
+
+
+async def buscar_legales(cache_legales, tarjetas):
+    """
+    Legales ya conocidos por id de tarjeta. Sin cache (p. ej. corriendo un
+    scraper suelto) no hay ninguno y se abre el modal de cada tarjeta.
+    """
+    return await cache_legales.buscar(tarjetas) if cache_legales else {}
+
+
+async def guardar_legales(cache_legales, legales):
+    if cache_legales:
+        await cache_legales.guardar(legales)
+
+
+def ejecutar_standalone(extractor, headless=True):
+    """
+    Corre un extractor async en su propio navegador. Lo usan los `__main__` de cada scraper.
+    """
+    async def _run():
+        async with async_playwright() as p:
+            navegador = await p.chromium.launch(headless=headless)
+            try:
+                contexto = await navegador.new_context()
+                return await extractor(contexto)
+            finally:
+                await navegador.close()
+
+    return asyncio.run(_run())
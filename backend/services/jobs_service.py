@@ -0,0 +1,196 @@
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from redis.exceptions import WatchError
+
+from backend.models import ExtraccionDia
+from backend.openai_agent import procesar_supermercados_async, supermercados, dias
+from backend.redis_crud import r, fetch_ids_bulk, save_promotions
+from backend.services.summary_service import summarize_pending_legales
+
+logger = logging.getLogger(__name__)
+
+# Cola de refrescos de promociones (ver worker() más abajo):
+#   jobs:queue        lista de ids pendientes (LPUSH / BLMOVE)
+#   jobs:processing   ids tomados por un worker; si el worker muere vuelven a la cola
+#   jobs:active       id del job encolado o en curso, para no duplicar corridas
+#   job:<id>          hash con status, fechas, opciones y progreso:
+#                       day:<super>:<dia>  pending | ok | cache | error: <detalle>
+#                       super:<super>      pending | saved | unchanged | error: <detalle>
+JOB_QUEUE_KEY = "jobs:queue"
+JOB_PROCESSING_KEY = "jobs:processing"
+JOB_ACTIVE_KEY = "jobs:active"
+JOB_PREFIX = "job:"
+JOB_TTL = int(os.getenv("JOB_TTL", str(7 * 24 * 3600)))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def enqueue_refresh(force: bool = False) -> dict:
+    """
+    Encola un refresco de promociones y devuelve {"job_id", "created"}.
+    Si ya hay uno encolado o en curso devuelve ese en lugar de crear otro.
+    El reclamo de jobs:active y la creación del job van en la misma transacción
+    (WATCH sobre jobs:active), así dos pedidos simultáneos no crean dos jobs.
+    """
+    job_id = uuid.uuid4().hex
+    progreso = {f"day:{s}:{d}": "pending" for s in supermercados for d in dias}
+    progreso.update({f"super:{s}": "pending" for s in supermercados})
+    key = f"{JOB_PREFIX}{job_id}"
+    async with r.pipeline(transaction=True) as tx:
+        while True:
+            try:
+                await tx.watch(JOB_ACTIVE_KEY)
+                activo = await tx.get(JOB_ACTIVE_KEY)
+                # Un jobs:active cuyo job ya venció (o nunca se creó) no bloquea
+                if activo and await tx.exists(f"{JOB_PREFIX}{activo}"):
+                    return {"job_id": activo, "created": False}
+                tx.multi()
+                tx.set(JOB_ACTIVE_KEY, job_id)
+                tx.hset(key, mapping={
+                    "status": "queued",
+                    "force": int(force),
+                    "created_at": _now(),
+                    **progreso,
+                })
+                tx.expire(key, JOB_TTL)
+                tx.lpush(JOB_QUEUE_KEY, job_id)
+                await tx.execute()
+                return {"job_id": job_id, "created": True}
+            except WatchError:
+                continue
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """Estado de un job con el progreso agrupado por supermercado y día."""
+    data = await r.hgetall(f"{JOB_PREFIX}{job_id}")
+    if not data:
+        return None
+    job = {"id": job_id, "supermarkets": {}}
+    for campo, valor in data.items():
+        if campo.startswith("day:"):
+            _, nombre, dia = campo.split(":", 2)
+            job["supermarkets"].setdefault(nombre, {"status": "pending", "days": {}})["days"][dia] = valor
+        elif campo.startswith("super:"):
+            nombre = campo.split(":", 1)[1]
+            job["supermarkets"].setdefault(nombre, {"status": "pending", "days": {}})["status"] = valor
+        elif campo == "force":
+            job["force"] = valor == "1"
+        else:
+            job[campo] = valor
+    return job
+
+
+async def _guardar_supermercado(nombre: str, parciales: List[ExtraccionDia]) -> str:
+    """
+    Guarda las promociones de todos los días de un supermercado, reemplazando las anteriores.
+    No escribe (y devuelve "error: ...") si algún día falló: una lista parcial
+    borraría las promociones de los días que faltan. Tampoco reemplaza un
+    catálogo con promociones por uno vacío.
+    """
+    fallidos = [p for p in parciales if p.error and not p.desde_cache]
+    if fallidos:
+        return "error: " + "; ".join(f"{p.dia}: {p.error}" for p in sorted(fallidos, key=lambda p: dias.index(p.dia)))
+
+    # Mismo orden que procesar_supermercados_async (por día) para que la huella sea estable
+    parciales = sorted(parciales, key=lambda p: dias.index(p.dia))
+    promociones = [d.model_dump() for p in parciales for d in p.descuentos]
+    guardadas = (await fetch_ids_bulk([nombre]))[0]
+    if not promociones and guardadas and guardadas["ids"]:
+        return "error: la extracción no devolvió promociones; se conservan las guardadas"
+    return "saved" if await save_promotions(nombre, promociones) else "unchanged"
+
+
+async def run_refresh_job(job_id: str) -> None:
+    """
+    Ejecuta un job: extrae todas las combinaciones (supermercado, día), anota el
+    progreso de cada una y guarda cada supermercado en promo:* apenas terminan
+    todos sus días, sin esperar al resto. Al final resume los legales nuevos.
+    Cualquier error deja el job en "failed"; sólo lanza si ni eso se pudo anotar.
+    """
+    key = f"{JOB_PREFIX}{job_id}"
+    por_supermercado: Dict[str, List[ExtraccionDia]] = {s: [] for s in supermercados}
+    guardados = []
+
+    async def on_parcial(parcial: ExtraccionDia):
+        estado = f"error: {parcial.error}" if parcial.error else ("cache" if parcial.desde_cache else "ok")
+        await r.hset(key, f"day:{parcial.supermercado}:{parcial.dia}", estado)
+        recibidos = por_supermercado[parcial.supermercado]
+        recibidos.append(parcial)
+        if len(recibidos) == len(dias):
+            guardados.append(asyncio.ensure_future(_finalizar(parcial.supermercado, recibidos)))
+
+    async def _finalizar(nombre: str, parciales: List[ExtraccionDia]):
+        try:
+            estado = await _guardar_supermercado(nombre, parciales)
+        except Exception as e:
+            logger.error("Error guardando %s en el job %s: %s", nombre, job_id, e)
+            estado = f"error: {e}"
+        await r.hset(key, f"super:{nombre}", estado)
+
+    try:
+        force = await r.hget(key, "force") == "1"
+        await r.hset(key, mapping={"status": "running", "started_at": _now()})
+        await procesar_supermercados_async(on_parcial=on_parcial, usar_cache=not force)
+        await asyncio.gather(*guardados)
+        try:
+            await summarize_pending_legales()
+        except Exception as e:
+            # Las promociones ya quedaron guardadas; los legales siguen en cola para la próxima
+            logger.warning("Error resumiendo legales en el job %s: %s", job_id, e)
+            await r.hset(key, "summaries", f"error: {e}")
+        await r.hset(key, mapping={"status": "done", "finished_at": _now()})
+    except Exception as e:
+        logger.error("Job %s falló: %s", job_id, e)
+        await r.hset(key, mapping={"status": "failed", "error": str(e), "finished_at": _now()})
+    finally:
+        # Sólo libera jobs:active si sigue apuntando a este job
+        if await r.get(JOB_ACTIVE_KEY) == job_id:
+            await r.delete(JOB_ACTIVE_KEY)
+
+
+async def worker(poll_timeout: float = 5) -> None:
+    """
+    Toma jobs de la cola de a uno. Los que quedaron en jobs:processing (un worker
+    anterior murió a mitad) se vuelven a encolar al arrancar, por eso se asume
+    un único worker: `python -m backend.services.jobs_service`.
+    Un error (de un job o de Redis) se loguea y el worker sigue con el próximo;
+    un job sólo sale de jobs:processing cuando terminó o quedó marcado como fallido.
+    """
+    while await r.lmove(JOB_PROCESSING_KEY, JOB_QUEUE_KEY, "RIGHT", "LEFT"):
+        pass
+    logger.info("Worker de promociones esperando jobs...")
+    while True:
+        try:
+            job_id = await r.blmove(JOB_QUEUE_KEY, JOB_PROCESSING_KEY, poll_timeout, "RIGHT", "LEFT")
+        except Exception as e:
+            logger.error("Error leyendo la cola de jobs: %s", e)
+            await asyncio.sleep(poll_timeout)
+            continue
+        if not job_id:
+            continue
+        logger.info("Procesando job %s", job_id)
+        try:
+            await run_refresh_job(job_id)
+        except Exception as e:
+            logger.exception("Error inesperado en el job %s: %s", job_id, e)
+            try:
+                await r.hset(f"{JOB_PREFIX}{job_id}", mapping={"status": "failed", "error": str(e), "finished_at": _now()})
+            except Exception:
+                # Queda en jobs:processing y se vuelve a encolar cuando el worker reinicie
+                continue
+        try:
+            await r.lrem(JOB_PROCESSING_KEY, 1, job_id)
+        except Exception as e:
+            logger.error("No se pudo sacar el job %s de %s: %s", job_id, JOB_PROCESSING_KEY, e)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(worker())
@@ -92,6 +92,15 @@ async def refresh_remuneradas(redis) -> dict:
     return payload
 
 
+async def get_cached_raw(redis) -> str | None:
+    """Cached rates as the stored JSON string (no parsing), or None."""
+    try:
+        return await redis.get("rates:remuneradas")
+    except Exception as e:
+        logger.error("Error leyendo tasas remuneradas cacheadas: %s", e)
+        return None
+
+
 async def get_cached_or_refresh(redis) -> dict:
     """Get cached rates or refresh them if needed."""
     try:
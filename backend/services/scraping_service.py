@@ -0,0 +1,121 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+from backend import carrefour, cordiez, coto, dia, jumbo
+from backend.legales import CacheLegales
+from backend.models import Descuento, InfoSupermercado
+from backend.redis_crud import save_promotions, update_promotions
+from backend.services.summary_service import summarize_pending_legales
+
+logger = logging.getLogger(__name__)
+SCRAPER_TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", "300"))
+
+# Extractor async de cada sitio; todos reciben un BrowserContext propio.
+SCRAPERS = {
+    "Carrefour": carrefour.extraer_promociones,
+    "Dia": dia.extraer_promociones,
+    "Jumbo": jumbo.extraer_promociones_jumbo,
+    "Coto": coto.extraer_promociones_coto,
+    "Cordiez": cordiez.extraer_promos_cordiez,
+}
+
+# Sitios que abren un modal/sección por tarjeta para leer los legales; reciben
+# una CacheLegales para saltear el click en tarjetas ya vistas.
+SCRAPERS_CON_LEGALES = {"Carrefour", "Dia", "Jumbo"}
+
+
+def medio_pago_desde_logo(logo: Optional[str]) -> str:
+    """
+    Nombre aproximado del medio de pago a partir de la URL del logo,
+    p. ej. ".../ids/123/galicia-modo.png?v=1" -> "Galicia Modo".
+    """
+    if not logo:
+        return ""
+    nombre = os.path.splitext(os.path.basename(urlparse(logo).path))[0]
+    nombre = re.sub(r"[-_]+", " ", nombre)
+    nombre = re.sub(r"\b(logo|icon|img|\d+)\b", " ", nombre, flags=re.IGNORECASE)
+    return " ".join(nombre.split()).title()
+
+
+def normalizar_resultado(nombre: str, promociones: List[dict]) -> InfoSupermercado:
+    """
+    Convierte la salida cruda de un scraper al formato que guarda update_promotions.
+    """
+    descuentos = []
+    for i, promo in enumerate(promociones):
+        try:
+            descuentos.append(Descuento(
+                medio_pago=promo.get("medio_pago") or medio_pago_desde_logo(promo.get("logo")),
+                descuento=promo.get("descuento", ""),
+                aplica_en=promo.get("aplica_en") or None,
+                tope=promo.get("tope", ""),
+                detalles=promo.get("detalles", ""),
+                legales=promo.get("legales") or None,
+                logo=promo.get("logo") or None,
+            ))
+        except Exception as e:
+            logger.warning("Promoción %d de %s inválida: %s", i, nombre, e)
+    return InfoSupermercado(supermercado=nombre, descuentos=descuentos)
+
+
+async def _run_site(browser, nombre: str, timeout: float) -> Optional[InfoSupermercado]:
+    contexto = await browser.new_context()
+    try:
+        kwargs = {"cache_legales": CacheLegales(nombre)} if nombre in SCRAPERS_CON_LEGALES else {}
+        promociones = await asyncio.wait_for(SCRAPERS[nombre](contexto, **kwargs), timeout)
+        logger.info("%s: %d promociones", nombre, len(promociones))
+        return normalizar_resultado(nombre, promociones)
+    except asyncio.TimeoutError:
+        logger.error("%s: se superó el timeout de %.0fs", nombre, timeout)
+    except Exception as e:
+        logger.error("%s: error al scrapear: %s", nombre, e)
+    finally:
+        await contexto.close()
+    return None
+
+
+async def scrape_all(
+    sitios: Optional[List[str]] = None,
+    timeouts: Optional[Dict[str, float]] = None,
+    headless: bool = True,
+) -> List[InfoSupermercado]:
+    """
+    Corre los scrapers en paralelo sobre un único Chromium (un contexto por sitio).
+    Los sitios que fallan o superan su timeout se omiten del resultado.
+    """
+    sitios = sitios or list(SCRAPERS)
+    timeouts = timeouts or {}
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            resultados = await asyncio.gather(*[
+                _run_site(browser, nombre, timeouts.get(nombre, SCRAPER_TIMEOUT))
+                for nombre in sitios
+            ])
+        finally:
+            await browser.close()
+
+    return [r for r in resultados if r is not None]
+
+
+async def refresh_promotions_from_scrapers(sitios: Optional[List[str]] = None) -> List[InfoSupermercado]:
+    """Scrape every site and store the results in Redis."""
+    resultados = await scrape_all(sitios)
+    for info in resultados:
+        promociones = [d.model_dump() for d in info.descuentos]
+        if not await update_promotions(info.supermercado, promociones):
+            await save_promotions(info.supermercado, promociones)
+    await summarize_pending_legales()
+    return resultados
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(refresh_promotions_from_scrapers())
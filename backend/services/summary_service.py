@@ -0,0 +1,102 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List
+
+from backend.llm_cache import get_cached_summaries, persist_summaries, set_cached_summaries
+from backend.openai_agent import completar_con_reintentos
+from backend.redis_crud import (
+    r,
+    SUMMARY_QUEUE_KEY,
+    bump_catalog_version,
+    fetch_legal_texts,
+    is_summarizable,
+    materialize_views,
+)
+
+logger = logging.getLogger(__name__)
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "8"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+SUMMARY_TOKENS_PER_TEXT = 200
+
+PROMPT_LOTE = """Resumí en pocas palabras cada uno de estos textos legales para un consumidor.
+Respondé exclusivamente en JSON con el formato {{"resumenes": [{{"id": "<id>", "resumen": "<resumen>"}}]}},
+con un elemento por cada id recibido.
+
+{textos}"""
+
+# Evita dos corridas simultáneas (p. ej. dos ingestas seguidas) resumiendo lo mismo
+_lock = asyncio.Lock()
+
+
+async def _resumir_lote(textos: Dict[str, str]) -> Dict[str, str]:
+    """Resume varios textos legales (id -> texto) en una sola llamada al modelo."""
+    prompt = PROMPT_LOTE.format(textos="\n\n".join(f"[{i}]\n{t}" for i, t in textos.items()))
+    response = await completar_con_reintentos(
+        prompt,
+        SUMMARY_TOKENS_PER_TEXT * len(textos),
+        model="gpt-4o",
+        response_format={"type": "json_object"},
+    )
+    parsed = json.loads(response.choices[0].message.content)
+    return {
+        item["id"]: item["resumen"]
+        for item in parsed.get("resumenes", [])
+        if item.get("id") in textos and item.get("resumen")
+    }
+
+
+async def summarize_pending_legales() -> int:
+    """
+    Resume los legales encolados por la ingesta (idx:summary_pending) que todavía
+    no tienen resumen, en lotes de SUMMARY_BATCH_SIZE textos y con a lo sumo
+    SUMMARY_CONCURRENCY llamadas en vuelo. Cada id sale de la cola recién cuando
+    su resumen quedó guardado (o no hace falta), así un corte a mitad no pierde
+    nada; los que fallan quedan para la próxima corrida.
+    Devuelve cuántos resúmenes nuevos se guardaron.
+    """
+    async with _lock:
+        pendientes: List[str] = [i async for i in r.sscan_iter(SUMMARY_QUEUE_KEY, count=500)]
+        if not pendientes:
+            return 0
+
+        # Los textos ya resumidos (mismo contenido en otra promo o en otra ingesta) no se repiten
+        existentes = await get_cached_summaries(pendientes)
+        # Pueden venir de POST /summary (con vencimiento) antes de que el texto se guardara
+        await persist_summaries(list(existentes))
+        textos = await fetch_legal_texts(i for i in pendientes if i not in existentes)
+        textos = {i: t for i, t in textos.items() if is_summarizable(t)}
+        # Ya resumidos, sin texto guardado o que no son texto legal: no hay nada que hacer con ellos
+        resueltos = [i for i in pendientes if i not in textos]
+        if resueltos:
+            await r.srem(SUMMARY_QUEUE_KEY, *resueltos)
+        ids = list(textos)
+        lotes = [ids[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(ids), SUMMARY_BATCH_SIZE)]
+        semaforo = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+        async def _procesar(lote: List[str]) -> int:
+            async with semaforo:
+                try:
+                    resumenes = await _resumir_lote({i: textos[i] for i in lote})
+                except Exception as e:
+                    logger.warning("Error resumiendo lote de %d legales: %s", len(lote), e)
+                    resumenes = {}
+            if resumenes:
+                await set_cached_summaries(resumenes)
+                await r.srem(SUMMARY_QUEUE_KEY, *resumenes)
+            return len(resumenes)
+
+        total = sum(await asyncio.gather(*[_procesar(lote) for lote in lotes]))
+        if total:
+            # Las respuestas (materializadas o no) incluyen `legales_resumen`; la versión
+            # va primero para que las vistas nuevas queden etiquetadas con ella
+            await bump_catalog_version()
+            await materialize_views()
+        logger.info("Resúmenes de legales: %d nuevos, %d ya existentes", total, len(existentes))
+        return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(summarize_pending_legales())
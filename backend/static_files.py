@@ -0,0 +1,210 @@
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli se sirven sólo las variantes .br ya generadas en el build
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Frontend estático (frontend/dist) servido desde memoria.
+# Todo el bundle se lee una vez al arrancar, con sus variantes comprimidas:
+# las .br/.gz que ya existan junto a cada archivo (ver `python -m backend.static_files`)
+# o, si no, comprimidas en ese momento. Por request sólo se elige la variante.
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/manifest+json")
+MIN_COMPRESS_SIZE = 1024
+
+# Vite genera assets/<nombre>-<hash>.<ext>: el contenido de una URL nunca cambia
+IMMUTABLE_PREFIX = "assets/"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = f"public, max-age={int(os.getenv('STATIC_MAX_AGE', '3600'))}"
+INDEX_CACHE = "no-cache"
+
+
+@dataclass
+class StaticAsset:
+    content: bytes
+    media_type: str
+    cache_control: str
+    etag: str                                                # de la representación sin comprimir
+    encoded: Dict[str, bytes] = field(default_factory=dict)  # "br" / "gzip" -> contenido
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # Cada content-coding es otra representación: necesita su propio validador fuerte
+        return f'{self.etag[:-1]}-{encoding}"' if encoding else self.etag
+
+
+def _is_compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _read_variant(path: str) -> Optional[bytes]:
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return None
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """
+    Accept-Encoding -> {codificación: q}, p. ej. "br;q=0, gzip" -> {"br": 0.0, "gzip": 1.0}.
+    """
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _compress(content: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    return variants
+
+
+def load_asset(path: str, relative: str) -> StaticAsset:
+    with open(path, "rb") as f:
+        content = f.read()
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    if relative == "index.html":
+        cache_control = INDEX_CACHE
+    elif relative.startswith(IMMUTABLE_PREFIX):
+        cache_control = IMMUTABLE_CACHE
+    else:
+        cache_control = DEFAULT_CACHE
+
+    asset = StaticAsset(
+        content=content,
+        media_type=media_type,
+        cache_control=cache_control,
+        etag=f'"{hashlib.sha256(content).hexdigest()[:16]}"',
+    )
+    if _is_compressible(media_type) and len(content) >= MIN_COMPRESS_SIZE:
+        prebuilt = {
+            "br": _read_variant(f"{path}.br"),
+            "gzip": _read_variant(f"{path}.gz"),
+        }
+        asset.encoded = {k: v for k, v in prebuilt.items() if v is not None}
+        for encoding, data in _compress(content).items():
+            asset.encoded.setdefault(encoding, data)
+        # Una variante que no achica el archivo no vale la pena
+        asset.encoded = {k: v for k, v in asset.encoded.items() if len(v) < len(content)}
+    return asset
+
+
+class StaticSite:
+    """
+    Sirve un build de SPA desde memoria: negocia br/gzip, responde 304 por ETag
+    y devuelve index.html para cualquier ruta sin extensión (rutas del router).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self.assets: Dict[str, StaticAsset] = {}
+        self.index: Optional[StaticAsset] = None
+
+    def load(self) -> None:
+        assets = {}
+        if not os.path.isdir(self.directory):
+            logger.warning("No existe el build del frontend en %s", self.directory)
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith((".br", ".gz")):
+                    continue
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                assets[relative] = load_asset(path, relative)
+        self.assets = assets
+        self.index = assets.get("index.html")
+        logger.info("Frontend cargado en memoria: %d archivos", len(assets))
+
+    def _lookup(self, path: str) -> Optional[StaticAsset]:
+        path = path.strip("/")
+        if not path:
+            return self.index
+        asset = self.assets.get(path) or self.assets.get(f"{path}/index.html")
+        if asset is None and "." not in path.rsplit("/", 1)[-1]:
+            return self.index
+        return asset
+
+    def response(self, request: Request, path: str) -> Response:
+        asset = self._lookup(path)
+        if asset is None:
+            return Response(status_code=404)
+
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next(
+            (e for e in ("br", "gzip") if e in asset.encoded and accepted.get(e, accepted.get("*", 0)) > 0),
+            None,
+        )
+        headers = {
+            "ETag": asset.etag_for(encoding),
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and headers["ETag"] in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+            return Response(status_code=304, headers=headers)
+
+        content = asset.content
+        if encoding:
+            content = asset.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(content))
+            return Response(status_code=200, headers=headers, media_type=asset.media_type)
+        return Response(content=content, headers=headers, media_type=asset.media_type)
+
+
+def precompress(directory: str) -> None:
+    """
+    Escribe las variantes .gz (y .br si está brotli) junto a cada archivo
+    comprimible, para correr después de `npm run build`.
+    """
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith((".br", ".gz")):
+                continue
+            path = os.path.join(root, name)
+            media_type = mimetypes.guess_type(path)[0] or ""
+            if not _is_compressible(media_type) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, "rb") as f:
+                content = f.read()
+            for encoding, data in _compress(content).items():
+                suffix = ".br" if encoding == "br" else ".gz"
+                with open(path + suffix, "wb") as f:
+                    f.write(data)
+            print(f"🗜️ {os.path.relpath(path, directory)}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    here = os.path.dirname(os.path.realpath(__file__))
+    precompress(sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, "..", "frontend", "dist"))
@@ -0,0 +1,37 @@
+from backend.ingest import DIAS, extract_cap_period, extract_channels, extract_days
+
+
+def test_extract_days_single_and_plural():
+    assert extract_days("Solo los jueves") == ["jueves"]
+    assert extract_days("Sábados") == ["sabado"]
+    assert extract_days("Válido sábados y domingos") == ["sabado", "domingo"]
+    assert extract_days("Miércoles", "Tope: $5.000") == ["miercoles"]
+
+
+def test_extract_days_ranges():
+    assert extract_days("De lunes a miércoles") == ["lunes", "martes", "miercoles"]
+    assert extract_days("De viernes a lunes") == ["lunes", "viernes", "sabado", "domingo"]
+    assert extract_days("lunes a jueves") == ["lunes", "martes", "miercoles", "jueves"]
+    assert extract_days("Fines de semana") == ["sabado", "domingo"]
+
+
+def test_extract_days_defaults_to_every_day():
+    assert extract_days("Todos los días") == DIAS
+    assert extract_days("25% de descuento") == DIAS
+    assert extract_days("") == DIAS
+
+
+def test_extract_cap_period():
+    assert extract_cap_period("Tope: $5.000 semanal") == "semanal"
+    assert extract_cap_period("Tope $15.000 por mes") == "mensual"
+    assert extract_cap_period("Tope por día $2.000") == "diario"
+    assert extract_cap_period("Tope por transacción") == "por_compra"
+    assert extract_cap_period("Sin tope") is None
+
+
+def test_extract_channels():
+    assert extract_channels("online") == (True, False)
+    assert extract_channels("Tienda") == (False, True)
+    assert extract_channels("online y tienda") == (True, True)
+    assert extract_channels(["Online", "Tienda física"]) == (True, True)
+    assert extract_channels(None) == (True, True)
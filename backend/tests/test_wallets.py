@@ -0,0 +1,51 @@
+from backend.wallets import AhoCorasick, WalletMatcher, default_matcher, normalize_tokens, wallet_slug
+
+
+def test_aho_corasick_finds_all_overlapping_patterns():
+    automaton = AhoCorasick({"he": "he", "she": "she", "his": "his", "hers": "hers"})
+    found = sorted(automaton.iter("ushers"))
+    assert found == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+    assert list(automaton.iter("xyz")) == []
+
+
+def test_normalization_ignores_accents_case_and_spacing():
+    assert normalize_tokens("Éminent MODO") == [("Éminent", "eminent"), ("MODO", "modo")]
+    assert wallet_slug("Mercado Pago") == wallet_slug("MercadoPago") == "mercadopago"
+    assert default_matcher.find("EMINENT") == default_matcher.find("Éminent") == ["eminent"]
+    assert default_matcher.find("mercado  pago") == default_matcher.find("Mercadopago") == ["mercadopago"]
+
+
+def test_matches_respect_word_boundaries():
+    assert default_matcher.find("acomodo") == []
+    assert default_matcher.find("Pagá con MODO") == ["modo"]
+    assert default_matcher.find("Visa Galicia MODO") == ["visa", "galicia", "modo"]
+
+
+def test_overlapping_matches_prefer_coverage():
+    assert default_matcher.wallets_in("Tarjeta Naranja X") == {"naranjax": "Naranja X"}
+    assert default_matcher.wallets_in("Tarjeta Naranja") == {"naranja": "Naranja"}
+    assert default_matcher.wallets_in("Galicia Eminent MODO") == {"eminent": "Éminent", "modo": "MODO"}
+
+
+def test_banks_named_like_common_words_need_qualifying():
+    assert default_matcher.find("Club La Nación") == []
+    assert default_matcher.find("Banco Nación") == ["banconacion"]
+    assert default_matcher.find("BNA+") == ["banconacion"]
+    assert default_matcher.find("Ciudad de Buenos Aires") == []
+    assert default_matcher.find("Banco Ciudad") == ["bancociudad"]
+
+
+def test_residual_wallet_only_for_a_single_unrecognized_run():
+    assert default_matcher.wallets_in("Banco Foo") == {"foo": "Foo"}
+    assert default_matcher.wallets_in("Club La Nación") == {"clubnacion": "Club Nación"}
+    assert default_matcher.wallets_in("Banco Foo MODO") == {"modo": "MODO", "foo": "Foo"}
+    assert default_matcher.wallets_in("Mastercard Black Galicia") == {"mastercard": "Mastercard", "galicia": "Galicia"}
+    assert default_matcher.wallets_in("ICBC Club") == {"icbc": "ICBC"}
+    assert default_matcher.wallets_in("Visa emitidas por Galicia para Plan Sueldo") == {"visa": "Visa", "galicia": "Galicia"}
+    assert default_matcher.wallets_in("Tarjeta de crédito") == {}
+
+
+def test_matcher_with_catalog_wallets():
+    matcher = WalletMatcher.from_dictionary(extra={"clubnacion": "Club Nación"})
+    assert matcher.find("club nacion") == ["clubnacion"]
+    assert matcher.wallets_in("Club La Nación") == {"clubnacion": "Club Nación"}
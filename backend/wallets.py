@@ -0,0 +1,226 @@
+import re
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.ingest import normalizar
+
+# Normalización de medios de pago.
+# Un medio de pago como "Visa Galicia MODO" o "Mercadopago" se traduce a billeteras
+# canónicas (["Visa", "Galicia", "MODO"], ["Mercado Pago"]) con un autómata
+# Aho-Corasick sobre el texto normalizado: sin tildes, sin mayúsculas y sin espacios,
+# así "Éminent"/"Eminent" y "Mercado Pago"/"MercadoPago" son la misma billetera.
+# Las coincidencias tienen que empezar y terminar en un límite de palabra del texto
+# original ("modo" no coincide dentro de "acomodo").
+
+# Nombre canónico -> alias (se normalizan al construir el autómata)
+WALLETS: Dict[str, List[str]] = {
+    # Plataformas
+    "MODO": ["modo"],
+    # Billeteras virtuales
+    "Mercado Pago": ["mercado pago", "mercadopago"],
+    "Cuenta DNI": ["cuenta dni"],
+    "Naranja X": ["naranja x", "naranjax"],
+    "Prex": ["prex"],
+    "Ualá": ["uala"],
+    "Personal Pay": ["personal pay"],
+    "Claro Pay": ["claro pay"],
+    "Lemon": ["lemon", "lemon cash"],
+    "Brubank": ["brubank"],
+    "Reba": ["reba"],
+    "YOY": ["yoy"],
+    # Bancos. Los nombres que también son palabras comunes ("nación", "ciudad",
+    # "provincia", "patagonia") sólo cuentan calificados: "Club La Nación" no es el banco.
+    "Galicia": ["galicia", "banco galicia"],
+    "Galicia Más": ["galicia mas"],
+    "Éminent": ["eminent", "galicia eminent"],
+    "Santander": ["santander", "santander rio"],
+    "BBVA": ["bbva", "frances", "bbva frances"],
+    "Macro": ["macro", "banco macro"],
+    "ICBC": ["icbc"],
+    "Banco Nación": ["banco nacion", "banco de la nacion", "bna", "bna mas"],
+    "Banco Provincia": ["banco provincia", "banco de la provincia", "bapro"],
+    "Banco Ciudad": ["banco ciudad", "banco de la ciudad"],
+    "Credicoop": ["credicoop"],
+    "Supervielle": ["supervielle"],
+    "Banco Patagonia": ["banco patagonia", "patagonia 365"],
+    "Hipotecario": ["hipotecario", "banco hipotecario"],
+    "Comafi": ["comafi"],
+    "Columbia": ["columbia"],
+    "Bancor": ["bancor", "banco de cordoba"],
+    # Tarjetas
+    "Visa": ["visa"],
+    "Mastercard": ["mastercard", "master card", "master"],
+    "American Express": ["american express", "amex"],
+    "Cabal": ["cabal"],
+    "Naranja": ["naranja", "tarjeta naranja"],
+    "Cencosud": ["cencosud", "tarjeta cencosud"],
+}
+
+# Palabras que no nombran una billetera; no cuentan como resto del medio de pago
+STOPWORDS = {
+    "tarjeta", "tarjetas", "credito", "creditos", "debito", "debitos", "banco", "bancos",
+    "de", "del", "la", "las", "el", "los", "y", "o", "con", "en", "mediante", "pagando",
+    "pago", "pagos", "app", "billetera", "billeteras", "virtual", "virtuales", "clientes",
+    "todas", "todos", "prepaga", "prepagas", "qr", "cuota", "cuotas", "sin", "interes",
+}
+
+
+def normalize_tokens(texto: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    Palabras de un texto como (original, normalizada), p. ej. "Éminent MODO" ->
+    [("Éminent", "eminent"), ("MODO", "modo")].
+    """
+    tokens = []
+    for original in re.findall(r"\w+", texto or ""):
+        normalized = re.sub(r"[^a-z0-9]", "", normalizar(original))
+        if normalized:
+            tokens.append((original, normalized))
+    return tokens
+
+
+def wallet_slug(texto: Optional[str]) -> str:
+    """
+    Clave de una billetera: texto normalizado sin espacios ("Mercado Pago" -> "mercadopago").
+    """
+    return "".join(n for _, n in normalize_tokens(texto))
+
+
+class AhoCorasick:
+    """
+    Autómata Aho-Corasick: encuentra todas las apariciones de muchos patrones
+    en una sola pasada sobre el texto.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]  # (largo del patrón, valor)
+        for pattern, value in patterns.items():
+            self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern: str, value: str) -> None:
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.out[state].append((len(pattern), value))
+
+    def _link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """(inicio, fin, valor) de cada aparición de un patrón en `text`."""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, value in self.out[state]:
+                yield i + 1 - length, i + 1, value
+
+
+class WalletMatcher:
+    """
+    Billeteras canónicas presentes en un medio de pago. `names` mapea slug -> nombre
+    a mostrar; además del diccionario puede incluir billeteras descubiertas en el catálogo.
+    """
+
+    def __init__(self, names: Dict[str, str], aliases: Dict[str, str]):
+        self.names = names
+        self.automaton = AhoCorasick(aliases)
+
+    @classmethod
+    def from_dictionary(cls, extra: Optional[Dict[str, str]] = None) -> "WalletMatcher":
+        names: Dict[str, str] = {}
+        aliases: Dict[str, str] = {}
+        for canonical, alias_list in WALLETS.items():
+            slug = wallet_slug(canonical)
+            names[slug] = canonical
+            for alias in [canonical, *alias_list]:
+                aliases[wallet_slug(alias)] = slug
+        for slug, name in (extra or {}).items():
+            names.setdefault(slug, name)
+            aliases.setdefault(slug, slug)
+        return cls(names, aliases)
+
+    def _matches(self, tokens: List[Tuple[str, str]]) -> List[Tuple[int, int, str]]:
+        # Posiciones (en el texto sin espacios) donde empieza y termina cada palabra
+        starts, ends, offset = {}, {}, 0
+        for i, (_, normalized) in enumerate(tokens):
+            starts[offset] = i
+            offset += len(normalized)
+            ends[offset] = i + 1
+        compact = "".join(n for _, n in tokens)
+
+        by_start: Dict[int, List[Tuple[int, str]]] = {}
+        for start, end, slug in self.automaton.iter(compact):
+            if start in starts and end in ends:
+                by_start.setdefault(starts[start], []).append((ends[end], slug))
+
+        # Entre coincidencias solapadas se elige la combinación que cubre más palabras
+        # que no son STOPWORDS y, a igual cobertura, con menos coincidencias (las más largas):
+        # en "Tarjeta Naranja X" gana "Naranja X" sobre "Tarjeta Naranja" (+ "X" suelta).
+        useful = [0] * (len(tokens) + 1)
+        for i, (_, normalized) in enumerate(tokens):
+            useful[i + 1] = useful[i] + (normalized not in STOPWORDS)
+        best: List[Tuple[Tuple[int, int], List[Tuple[int, int, str]]]] = [((0, 0), [])] * (len(tokens) + 1)
+        for first in range(len(tokens) - 1, -1, -1):
+            best[first] = best[first + 1]
+            for last, slug in by_start.get(first, []):
+                (covered, count), rest = best[last]
+                score = (covered + useful[last] - useful[first], count - 1)
+                if score > best[first][0]:
+                    best[first] = (score, [(first, last, slug)] + rest)
+        return best[0][1]
+
+    def find(self, texto: Optional[str]) -> List[str]:
+        """Slugs de las billeteras conocidas en `texto`, en orden de aparición."""
+        return list(dict.fromkeys(slug for _, _, slug in self._matches(normalize_tokens(texto))))
+
+    def wallets_in(self, medio_pago: Optional[str]) -> Dict[str, str]:
+        """
+        Billeteras (slug -> nombre) de un medio de pago: las reconocidas más, como
+        una billetera más, las palabras sin reconocer (que no sean STOPWORDS) si
+        nada se reconoció ("Banco Foo" -> {foo: Foo}) o si son un solo tramo
+        seguido de "banco" ("Banco Foo MODO" -> {modo: MODO, foo: Foo}).
+        Sueltas entre billeteras conocidas ("Mastercard Black Galicia") no cuentan.
+        """
+        tokens = normalize_tokens(medio_pago)
+        matches = self._matches(tokens)
+        wallets = {slug: self.names[slug] for _, _, slug in matches}
+
+        covered = set()
+        for first, last, _ in matches:
+            covered.update(range(first, last))
+        # Tramos de palabras sin reconocer, cortados por las billeteras reconocidas
+        runs: List[List[int]] = [[]]
+        for i, (_, normalized) in enumerate(tokens):
+            if i in covered:
+                runs.append([])
+            elif normalized not in STOPWORDS and not normalized.isdigit():
+                runs[-1].append(i)
+        runs = [run for run in runs if run]
+
+        after_banco = bool(runs) and runs[0][0] > 0 and tokens[runs[0][0] - 1][1] in ("banco", "bancos")
+        if len(runs) == 1 and (not matches or after_banco):
+            name = " ".join(tokens[i][0] for i in runs[0])
+            wallets.setdefault(wallet_slug(name), name)
+        return wallets
+
+
+# Sólo con el diccionario: es lo que usa la escritura para indexar cada promo
+default_matcher = WalletMatcher.from_dictionary()